@@ -1 +1,5 @@
-from aes.src.aes import AES
\ No newline at end of file
+from aes.src.aes import AES
+from aes.src.cache import KEY_CACHE
+from aes.src.parallel import ParallelAES
+from aes.src.container import open_container
+from aes.src.records import open_log
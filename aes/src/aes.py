@@ -1,19 +1,41 @@
 from aes.src.utils import *
+from aes.src.engines import ENGINES
+from aes.src.modes import ctr, GCM, ghash_tables, Encryptor, Decryptor
+from aes.src.cache import KEY_CACHE, KeySchedule
+from aes.src.metrics import timed
+from aes.src.compression import compress as compress_bytes, decompress as decompress_bytes
+
+# metric labels (mode, bytes) for each instrumented method
+describe_text = lambda self, text, cbc=False, iv=None, compress=False: ("cbc" if cbc else "ecb", len(text.encode("utf-8") if isinstance(text, str) else text)) # bytes, not characters
+describe_mode = lambda mode: lambda self, data, *args, **kwargs: (mode, len(data))
+describe_buffer = lambda self, data, out, mode="ecb", iv=None: (mode, memoryview(data).nbytes)
 
 ## AES ##
 class AES:
-    def __init__(self, key: str) -> None:
+    window_size = 1 << 16 # bytes handled per step by the buffer methods
+
+    def __init__(self, key, engine="standard", cache=True) -> None:
         assert len(key) in [16, 24, 32], "Invalid key length. AES allows 16, 24, or 32 key lengths."
+        assert engine in ENGINES, f"Invalid engine. AES allows {', '.join(ENGINES)} engines."
         self.key = key # global key
         self.rounds = {4: 10, 6: 12, 8: 14}[len(key) // 4]  # rounds based on key length
-        self.expanded_key = self.key_schedule(key) # expanded key
+
+        # expanded key (and everything built from it) is shared through the process-wide cache
+        build = lambda: (self.key_schedule(key), self.rounds)
+        key_bytes = key.encode("utf-8") if isinstance(key, str) else bytes(key)
+        self.schedule = KEY_CACHE.get(key_bytes, build) if cache else KeySchedule(*build())
+        self.expanded_key = self.schedule.expanded_key # expanded key
+
+        # optional faster block engine built from the expanded key (None runs the standard rounds below)
+        self.engine_name = engine
+        self.engine = self.schedule.engine(engine)
 
         self.default_iv = b"\x01" * 16 # used when cbc is checked but not iv provided
 
-    @record_time
-    def key_schedule(self, key: str) -> list:
-        """Expand the key to be used in encryption."""
-        expanded_key = to_matrix(list(key.encode("utf-8")))  # 4x4 matrix
+    @timed("key_schedule")
+    def key_schedule(self, key) -> list:
+        """Expand the key (str or bytes) to be used in encryption."""
+        expanded_key = to_matrix(list(key.encode("utf-8") if isinstance(key, str) else key))  # 4x4 matrix
         iteration_size = len(key) // 4 # Number of words in the key (4 bytes per word)
 
         # Loop to generate round keys
@@ -35,6 +57,9 @@ class AES:
 
     def encrypt_block(self, text: bytes) -> bytes:
         """Encrypt a 16 byte block using standard AES."""
+        if self.engine is not None:
+            return self.engine.encrypt_block(text)
+
         word_block_matrix = to_matrix(text) # Convert the padded text to a (decimal) matrix
 
         # Initial round (just add_round)
@@ -56,6 +81,9 @@ class AES:
 
     def decrypt_block(self, text: bytes) -> bytes:
         """Decrypt a 16 byte block using standard AES."""
+        if self.engine is not None:
+            return self.engine.decrypt_block(text)
+
         word_block_matrix = to_matrix(text) # Converts bytes to a (deciaml) matrix
 
         # Initial round (all but mix_columns)
@@ -75,48 +103,114 @@ class AES:
 
         return to_bytes(word_block_matrix) # Convert (decimal) matrix back to bytes
 
-    @record_time
-    def encrypt(self, text: str, cbc=False, iv=None) -> bytes:
-        """Encrypt the given text using the key. CBC is an option that uses an IV to add an extra layer of security."""
-        encoded_text = text.encode("utf-8") # Encodes text
-        padded_text = pkcs7_padding(encoded_text) # Adds padding
-        text_chunks = load_chunks(padded_text) # split incoming text into chunks of 16 bytes
-        encrypted_text = bytes() # variable for encrypted blocks to be added
-
-        # check to see if cbc is being used and fetch an iv
-        previous = (iv.encode("utf-8") if iv is not None else self.default_iv) if cbc else None # iv used for cbc 
-
-        # main encryption loop
-        for chunk in text_chunks:
-            if not cbc: 
-                encrypted_text += self.encrypt_block(chunk)
-            else:
-                new_chunk = self.encrypt_block(xor(chunk, previous)) # encrypt chunk
-                previous = new_chunk # sets new previous
-                encrypted_text += new_chunk # adds new chunk
-        
-        return encrypted_text
+    @timed("encrypt", describe_text)
+    def encrypt(self, text: str, cbc=False, iv=None, compress=False) -> bytes:
+        """Encrypt the given text using the key. CBC is an option that uses an IV to add an extra layer of security.
+        compress (True for zlib, or "zlib"/"lzma") compresses first when it helps, decrypt with the same option."""
+        data = text.encode("utf-8")
+        if compress:
+            data = compress_bytes(data, "zlib" if compress is True else compress) # flag byte records if it was compressed
+        encryptor = self.encryptor("cbc" if cbc else "ecb", iv)
+        return encryptor.update(data) + encryptor.finalize() # Encodes, pads and encrypts text
                 
-    @record_time
-    def decrypt(self, text: bytes, cbc=False, iv=None) -> str:
+    @timed("decrypt", describe_text)
+    def decrypt(self, text: bytes, cbc=False, iv=None, compress=False) -> str:
         """Decrypt the given bytes using the key. CBC is an option that uses an IV to add an extra layer of security."""
-        text_chunks = load_chunks(text) # split incoming text into chunks of 16 bytes
-        decrypted_text = bytes() # variable for decrypted blocks to be added
+        decryptor = self.decryptor("cbc" if cbc else "ecb", iv)
+        original_text = decryptor.update(text) + decryptor.finalize() # Decrypts and undoes any added padding
+        if compress:
+            original_text = decompress_bytes(original_text)
 
-        # check to see if cbc is being used and fetch an iv
-        previous = (iv.encode("utf-8") if iv is not None else self.default_iv) if cbc else None # iv used for cbc 
+        return original_text.decode("utf-8") # Decode text
 
-        # main decryption loop
-        for chunk in text_chunks:
-            if not cbc: 
-                decrypted_text += self.decrypt_block(chunk)
-            else:
-                decrypted_text += xor(previous, self.decrypt_block(chunk)) # adds new chunk
-                previous = chunk # sets new previous
+    def encryptor(self, mode="ecb", iv=None) -> Encryptor:
+        """Incremental encryption, call update(bytes) for each piece then finalize(). Modes: ecb, cbc, ctr, gcm."""
+        return Encryptor(self, mode, iv)
 
-        original_text = pkcs7_padding_undo(decrypted_text) # Undo any added padding 
+    def decryptor(self, mode="ecb", iv=None) -> Decryptor:
+        """Incremental decryption, call update(bytes) for each piece then finalize(). Modes: ecb, cbc, ctr, gcm."""
+        return Decryptor(self, mode, iv)
 
-        return original_text.decode("utf-8") # Decode text
+    def encrypted_size(self, length: int, mode="ecb") -> int:
+        """Output buffer size needed to encrypt length bytes (ecb/cbc add padding, gcm adds a 16 byte tag)."""
+        return {"ecb": padded_size(length), "cbc": padded_size(length), "ctr": length, "gcm": length + 16}[mode]
+
+    @timed("encrypt", describe_buffer)
+    def encrypt_into(self, data, out, mode="ecb", iv=None) -> int:
+        """Encrypt any buffer (bytes, bytearray, memoryview, mmap) into a writable buffer. Returns bytes written.
+        Not zero-copy: the engines build each window's result as new bytes, which is then copied into out (see run_into)."""
+        return self.run_into(self.encryptor(mode, iv), data, out, self.encrypted_size(len(memoryview(data).cast("B")), mode))
+
+    @timed("decrypt", describe_buffer)
+    def decrypt_into(self, data, out, mode="ecb", iv=None) -> int:
+        """Decrypt any buffer into a writable buffer (at most len(data) bytes are needed). Returns bytes written."""
+        source_length = len(memoryview(data).cast("B"))
+        return self.run_into(self.decryptor(mode, iv), data, out, source_length - 16 if mode == "gcm" else source_length)
+
+    def run_into(self, stream, data, out, needed: int) -> int:
+        """Feed data through an encryptor/decryptor one window at a time, copying each result into out.
+        The input is read through a memoryview, but every window is still copied once on the way in (joined with held back bytes)
+        and once on the way out (the engines return bytes), so memory stays at one window instead of the whole output."""
+        source = memoryview(data).cast("B")
+        target = memoryview(out).cast("B")
+        assert len(target) >= needed, f"Output buffer too small. {needed} bytes are needed."
+
+        written = 0
+        for index in range(0, len(source), self.window_size):
+            chunk = stream.update(source[index: index + self.window_size])
+            target[written: written + len(chunk)] = chunk
+            written += len(chunk)
+
+        chunk = stream.finalize()
+        target[written: written + len(chunk)] = chunk
+        return written + len(chunk)
+
+    @timed("encrypt", describe_mode("ctr"))
+    def encrypt_ctr(self, data: bytes, nonce, offset=0) -> bytes:
+        """Encrypt bytes in counter mode starting at any byte offset. No padding, output length equals input length."""
+        return ctr(self, data, nonce, offset)
+
+    @timed("decrypt", describe_mode("ctr"))
+    def decrypt_ctr(self, data: bytes, nonce, offset=0) -> bytes:
+        """Decrypt bytes in counter mode starting at any byte offset (the same keystream XOR as encryption)."""
+        return ctr(self, data, nonce, offset)
+
+    def ghash_tables(self) -> list:
+        """GHASH multiplication tables for this key (H = encrypted zero block), built once."""
+        if self.schedule.ghash_tables is None:
+            self.schedule.ghash_tables = ghash_tables(self.encrypt_block(bytes(16)))
+        return self.schedule.ghash_tables
+
+    def gcm(self, nonce, associated_data=b"") -> GCM:
+        """Start a streaming GCM message, call encrypt()/decrypt() on each piece then finalize()/verify()."""
+        return GCM(self, nonce, associated_data)
+
+    @timed("encrypt", describe_mode("gcm"))
+    def encrypt_gcm(self, data: bytes, nonce, associated_data=b"") -> bytes:
+        """Encrypt and authenticate bytes with GCM. Returns the ciphertext followed by a 16 byte tag."""
+        message = self.gcm(nonce, associated_data)
+        return message.encrypt(data) + message.finalize()
+
+    @timed("decrypt", describe_mode("gcm"))
+    def decrypt_gcm(self, data: bytes, nonce, associated_data=b"") -> bytes:
+        """Check and decrypt ciphertext followed by a 16 byte tag. Raises ValueError if anything was modified."""
+        assert len(data) >= 16, "GCM data is missing its tag."
+        message = self.gcm(nonce, associated_data)
+        plaintext = message.decrypt(data[:-16])
+        message.verify(data[-16:])
+        return plaintext
+
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Encrypt concatenated 16 byte blocks, batched when the engine supports it."""
+        if self.engine is not None:
+            return self.engine.encrypt_blocks(data)
+        return b"".join(self.encrypt_block(chunk) for chunk in load_chunks(data))
+
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Decrypt concatenated 16 byte blocks, batched when the engine supports it."""
+        if self.engine is not None:
+            return self.engine.decrypt_blocks(data)
+        return b"".join(self.decrypt_block(chunk) for chunk in load_chunks(data))
 
     def rot_bytes(self, word_block: list) -> list:
         """Rotate the bytes in the block to the left by one position."""
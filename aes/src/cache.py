@@ -0,0 +1,75 @@
+import hashlib, os, threading
+from collections import OrderedDict
+from aes.src.engines import ENGINES
+
+## KEY SCHEDULE CACHE ##
+class KeySchedule:
+    """Everything derived from one key: the expanded key, the engines built from it and the GHASH tables."""
+    def __init__(self, expanded_key: list, rounds: int) -> None:
+        self.expanded_key = expanded_key
+        self.rounds = rounds
+        self.engines = {} # engine name -> engine (the table engine holds the equivalent inverse cipher key)
+        self.ghash_tables = None
+        self.lock = threading.Lock()
+
+    def engine(self, name: str):
+        """Build an engine once per key, every AES object with this key shares it."""
+        with self.lock:
+            if name not in self.engines:
+                self.engines[name] = ENGINES[name](self.expanded_key, self.rounds) if ENGINES[name] is not None else None
+            return self.engines[name]
+
+class KeyScheduleCache:
+    def __init__(self, max_size=256) -> None:
+        self.max_size = max_size
+        self.schedules = OrderedDict() # key hash -> KeySchedule, least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_hash(key: bytes) -> bytes:
+        return hashlib.sha256(key).digest() # raw keys are never used as dict keys
+
+    def get(self, key: bytes, build) -> KeySchedule:
+        """Return the cached schedule for key, calling build() -> (expanded_key, rounds) on a miss."""
+        key_hash = self.key_hash(key)
+        with self.lock:
+            schedule = self.schedules.get(key_hash)
+            if schedule is not None:
+                self.schedules.move_to_end(key_hash)
+                self.hits += 1
+                return schedule
+            self.misses += 1
+
+        schedule = KeySchedule(*build()) # expand outside the lock, a race only costs a duplicate expansion
+        with self.lock:
+            self.schedules[key_hash] = schedule
+            self.schedules.move_to_end(key_hash)
+            self.evict()
+        return schedule
+
+    def evict(self) -> None:
+        """Drop least recently used schedules until the cache fits (lock must be held)."""
+        while len(self.schedules) > self.max_size:
+            self.schedules.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, max_size: int) -> None:
+        """Change the number of keys kept (0 disables caching)."""
+        with self.lock:
+            self.max_size = max_size
+            self.evict()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.schedules.clear()
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters."""
+        with self.lock:
+            return {"size": len(self.schedules), "max_size": self.max_size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# process-wide cache shared by every AES object, size can be set with AES_KEY_CACHE_SIZE
+KEY_CACHE = KeyScheduleCache(int(os.environ.get("AES_KEY_CACHE_SIZE", 256)))
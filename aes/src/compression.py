@@ -0,0 +1,51 @@
+import lzma, zlib
+
+## COMPRESSION ##
+# compressed data starts with one flag byte naming how the rest is stored, so incompressible input costs one byte
+STORED, ZLIB, LZMA = 0, 1, 2
+METHODS = {"zlib": ZLIB, "lzma": LZMA}
+MIN_SIZE = 64 # smaller inputs are stored, the compression header outweighs any saving
+SAMPLE_SIZE = 1 << 14 # bytes test compressed to decide how to handle the input
+SKIP_RATIO = 0.9 # inputs whose sample does not shrink below this are stored (already compressed, random, encrypted)
+GOOD_RATIO = 0.35 # samples below this compress well, a higher level saves more AES work than it costs
+LEVELS = {"zlib": (6, 9), "lzma": (1, 6)} # (default level, level for input that compresses well)
+MAX_SIZE = 1 << 28 # decompressed bytes allowed unless the caller knows the real size, a few KiB can otherwise expand into gigabytes
+
+def choose_level(data: bytes, method="zlib"):
+    """Adaptive level from a fast test compression of a sample, None when the input is not worth compressing."""
+    if len(data) < MIN_SIZE:
+        return None
+    sample = bytes(data[:SAMPLE_SIZE])
+    ratio = len(zlib.compress(sample, 1)) / len(sample)
+    if ratio > SKIP_RATIO:
+        return None
+    return LEVELS[method][1] if ratio < GOOD_RATIO else LEVELS[method][0]
+
+def compress(data: bytes, method="zlib") -> bytes:
+    """Flag byte followed by the compressed data, or by the data itself when compressing does not help."""
+    assert method in METHODS, f"Invalid compression. Allowed methods are {', '.join(METHODS)}."
+    level = choose_level(data, method)
+    if level is not None:
+        compressed = zlib.compress(data, level) if method == "zlib" else lzma.compress(data, preset=level)
+        if len(compressed) < len(data):
+            return bytes([METHODS[method]]) + compressed
+    return bytes([STORED]) + bytes(data)
+
+def decompress(data: bytes, max_size=MAX_SIZE) -> bytes:
+    """Undo compress(), the flag byte says how the data was stored. Raises ValueError if it would expand past max_size."""
+    assert len(data) > 0, "Compressed data is missing its flag byte."
+    flag, payload = data[0], data[1:]
+    if flag == STORED:
+        return bytes(payload)
+    if flag == ZLIB:
+        decompressor = zlib.decompressobj()
+    elif flag == LZMA:
+        decompressor = lzma.LZMADecompressor()
+    else:
+        raise ValueError(f"Unknown compression flag {flag}.")
+    output = decompressor.decompress(payload, max_size + 1) # stops one byte past the limit, never expands everything
+    if len(output) > max_size:
+        raise ValueError(f"Compressed data expands past {max_size} bytes.")
+    if not decompressor.eof:
+        raise ValueError("Compressed data is truncated.")
+    return output
@@ -0,0 +1,185 @@
+import bisect, os, struct
+from aes.src.compression import compress as compress_bytes, decompress as decompress_bytes
+
+## CONTAINER ##
+# header | chunk 0 | chunk 1 | ... | index (one entry per chunk) | trailer
+# every chunk is encrypted on its own with its own iv/nonce, so any byte range can be read without the rest of the file
+MAGIC = b"AESC"
+INDEX_MAGIC = b"AESI"
+VERSION = 2
+MODES = {"ctr": 0, "gcm": 1, "cbc": 2}
+HEADER = struct.Struct(">4sBBHI16s") # magic, version, mode (| COMPRESSED), key bits, chunk size, random file id
+ENTRY = struct.Struct(">QII16s") # file offset, stored length, plaintext length, iv (ctr uses 8 bytes, gcm 12, cbc 16)
+TRAILER = struct.Struct(">QI4s") # index offset, chunk count, magic
+COMPRESSED = 0x80 # mode flag, every chunk's plaintext is compress() output (flag byte + data)
+CHUNK_SIZE = 1 << 20 # plaintext bytes per chunk
+IV_LENGTH = {"ctr": 8, "gcm": 12, "cbc": 16}
+
+def is_container(path: str) -> bool:
+    """True if the file starts with the container magic."""
+    with open(path, "rb") as FILE:
+        return FILE.read(len(MAGIC)) == MAGIC
+
+def chunk_data(header: bytes, number: int, last: bool) -> bytes:
+    """GCM associated data of one chunk. The file id stops chunks moving between files, the number stops them moving
+    within one, and the flag on the last chunk makes a container cut short (with a rewritten index) fail to verify."""
+    return header + number.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+class ContainerWriter:
+    """Write side of a container, write() any amount then close() to add the index."""
+    def __init__(self, file, aes, mode="gcm", chunk_size=CHUNK_SIZE, owns_file=False, compress=None) -> None:
+        assert mode in MODES, f"Invalid mode. Containers allow {', '.join(MODES)} modes."
+        assert chunk_size > 0 and chunk_size % 16 == 0, "Chunk size must be a positive multiple of 16."
+        self.file = file
+        self.owns_file = owns_file # close the file too (set by open_container)
+        self.aes = aes
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.compress = compress # None, "zlib" or "lzma", each chunk is compressed on its own so random access still works
+        self.header = HEADER.pack(MAGIC, VERSION, MODES[mode] | (COMPRESSED if compress else 0), 8 * len(aes.key), chunk_size, os.urandom(16))
+        self.buffer = bytearray() # plaintext of the chunk being filled
+        self.entries = []
+        self.offset = len(self.header)
+        self.closed = False
+        file.write(self.header)
+
+    def write(self, data) -> int:
+        self.buffer += data
+        while len(self.buffer) > self.chunk_size: # a full chunk stays buffered until more data shows it is not the last one
+            self.write_chunk(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def write_chunk(self, data: bytes, last=False) -> None:
+        """Encrypt one chunk with a fresh random iv and record it in the index."""
+        iv = os.urandom(IV_LENGTH[self.mode])
+        plain_length = len(data)
+        if self.compress:
+            data = compress_bytes(data, self.compress)
+        if self.mode == "ctr":
+            stored = self.aes.encrypt_ctr(data, iv)
+        elif self.mode == "gcm": # authenticated with the header (random file id), chunk number and last chunk flag
+            stored = self.aes.encrypt_gcm(data, iv, chunk_data(self.header, len(self.entries), last))
+        else:
+            encryptor = self.aes.encryptor("cbc", iv)
+            stored = encryptor.update(data) + encryptor.finalize()
+        self.file.write(stored)
+        self.entries.append(ENTRY.pack(self.offset, len(stored), plain_length, iv.ljust(16, b"\x00")))
+        self.offset += len(stored)
+
+    def close(self) -> None:
+        """Encrypt the last partial chunk and write the index and trailer."""
+        if self.closed:
+            return
+        self.write_chunk(bytes(self.buffer), last=True) # always one, an empty file is one empty chunk
+        self.buffer.clear()
+        self.file.write(b"".join(self.entries))
+        self.file.write(TRAILER.pack(self.offset, len(self.entries), INDEX_MAGIC))
+        self.closed = True
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self) -> "ContainerWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+class ContainerReader:
+    """Read side of a container, like a file opened "rb": read(), seek(), tell(). Only the chunks asked for are decrypted."""
+    def __init__(self, file, aes, owns_file=False) -> None:
+        self.file = file
+        self.owns_file = owns_file # close the file too (set by open_container)
+        self.aes = aes
+
+        self.header = file.read(HEADER.size)
+        magic, version, mode, key_bits, self.chunk_size, self.file_id = HEADER.unpack(self.header)
+        assert magic == MAGIC, "Not an AES container."
+        assert version == VERSION, f"Unsupported container version {version}."
+        assert key_bits == 8 * len(aes.key), f"Container was written with a {key_bits}-bit key."
+        self.mode = {number: name for name, number in MODES.items()}[mode & ~COMPRESSED]
+        self.compressed = bool(mode & COMPRESSED)
+
+        # the index is at the end of the file, found through the fixed size trailer
+        file.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, count, index_magic = TRAILER.unpack(file.read(TRAILER.size))
+        assert index_magic == INDEX_MAGIC, "Container index is missing (the file was not closed)."
+        file.seek(index_offset)
+        self.entries = list(ENTRY.iter_unpack(file.read(ENTRY.size * count)))
+
+        self.starts = [0] # plaintext offset of every chunk
+        for _, _, length, _ in self.entries:
+            self.starts.append(self.starts[-1] + length)
+        self.size = self.starts.pop()
+        self.position = 0
+        self.cached = (None, b"") # last decrypted chunk (number, plaintext)
+        if self.mode == "gcm":
+            self.chunk(len(self.entries) - 1) # verifies the last chunk, a truncated container fails here
+
+    def chunk(self, number: int) -> bytes:
+        """Decrypt one whole chunk (gcm chunks are verified, raises ValueError if modified)."""
+        if self.cached[0] == number:
+            return self.cached[1]
+        offset, length, plain_length, iv = self.entries[number]
+        iv = iv[:IV_LENGTH[self.mode]]
+        self.file.seek(offset)
+        stored = self.file.read(length)
+        if self.mode == "ctr":
+            data = self.aes.decrypt_ctr(stored, iv)
+        elif self.mode == "gcm":
+            data = self.aes.decrypt_gcm(stored, iv, chunk_data(self.header, number, number == len(self.entries) - 1))
+        else:
+            decryptor = self.aes.decryptor("cbc", iv)
+            data = decryptor.update(stored) + decryptor.finalize()
+        if self.compressed:
+            data = decompress_bytes(data, min(plain_length, self.chunk_size)) # a chunk never expands past its length (the header's chunk size is authenticated)
+        self.cached = (number, data)
+        return data
+
+    def read_range(self, number: int, start: int, end: int) -> bytes:
+        """Plaintext bytes [start, end) of one chunk, ctr decrypts only those bytes."""
+        if self.mode == "ctr" and not self.compressed and self.cached[0] != number:
+            offset, _, _, iv = self.entries[number]
+            self.file.seek(offset + start)
+            return self.aes.decrypt_ctr(self.file.read(end - start), iv[:8], start)
+        return self.chunk(number)[start: end]
+
+    def read(self, size=-1) -> bytes:
+        """Read up to size bytes (all remaining bytes when size is negative) from the current position."""
+        end = self.size if size is None or size < 0 else min(self.position + size, self.size)
+        pieces = []
+        while self.position < end:
+            number = bisect.bisect_right(self.starts, self.position) - 1
+            start = self.position - self.starts[number]
+            stop = min(end - self.starts[number], self.entries[number][2])
+            pieces.append(self.read_range(number, start, stop))
+            self.position += stop - start
+        return b"".join(pieces)
+
+    def seek(self, offset: int, whence=os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.position, os.SEEK_END: self.size}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self) -> None:
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self) -> "ContainerReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+def open_container(path: str, aes, mode="r", cipher_mode="gcm", chunk_size=CHUNK_SIZE, compress=None):
+    """open() for containers, "r" returns a ContainerReader and "w" a ContainerWriter, both close the file when closed."""
+    assert mode in ("r", "w"), "Containers open with \"r\" or \"w\"."
+    if mode == "r":
+        return ContainerReader(open(path, "rb"), aes, owns_file=True)
+    return ContainerWriter(open(path, "wb"), aes, cipher_mode, chunk_size, owns_file=True, compress=compress)
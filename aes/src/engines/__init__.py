@@ -0,0 +1,10 @@
+from aes.src.engines.table import TableEngine
+from aes.src.engines.vectorized import NumpyEngine
+from aes.src.engines.bitslice import BitsliceEngine
+
+ENGINES = {
+    "standard": None, # list based rounds implemented directly on AES
+    "table": TableEngine,
+    "numpy": NumpyEngine, # requires numpy
+    "bitslice": BitsliceEngine, # pure python, constant-time
+}
@@ -0,0 +1,196 @@
+from aes.src.utils import SBOX, SBOX_INV, galois
+
+## CIRCUIT ##
+def linear_rows(func) -> list:
+    """Rows of a GF(2) linear byte map, row k lists the input bits XORed into output bit k."""
+    return [[i for i in range(8) if (func(1 << i) >> k) & 1] for k in range(8)]
+
+# multiplicative inverses in GF(2^8) from powers of the generator 3 (0 maps to 0)
+POWERS = [1]
+for _ in range(254):
+    POWERS.append(galois(POWERS[-1], 3))
+INVERSE = [0] * 256
+for exponent, power in enumerate(POWERS):
+    INVERSE[power] = POWERS[-exponent % 255]
+
+square = lambda x: galois(x, x)
+affine = lambda x: SBOX[INVERSE[x]] ^ 0x63 # linear part of the sbox affine transform
+affine_inv = lambda y: INVERSE[SBOX_INV[y ^ 0x63]] # its inverse
+
+SQUARE = linear_rows(square) # x^2
+POWER4 = linear_rows(lambda x: square(square(x))) # x^4
+POWER16 = linear_rows(lambda x: square(square(square(square(x))))) # x^16
+AFFINE = linear_rows(affine)
+AFFINE_INV = linear_rows(affine_inv)
+SBOX_CONSTANT = 0x63 # added after the affine transform
+SBOX_INV_CONSTANT = affine_inv(0x63) # removed before the inversion
+
+# state byte i sits in column i // 4, row i % 4, shift rows moves row r left by r columns
+SHIFT = [4 * ((index // 4 + index % 4) % 4) + index % 4 for index in range(16)]
+SHIFT_INV = [4 * ((index // 4 - index % 4) % 4) + index % 4 for index in range(16)]
+
+# translate tables used to move between bytes and bit slices
+BIT_CHARS = [bytes(0x30 + ((x >> j) & 1) for x in range(256)) for j in range(8)] # byte -> b"0"/b"1" for bit j
+BIT_VALUES = [bytes((1 << j) if x == 0x31 else 0 for x in range(256)) for j in range(8)] # b"0"/b"1" -> bit j value
+
+def linear(rows: list, bits: list) -> list:
+    """Apply a linear byte map to 8 bit slices."""
+    result = []
+    for row in rows:
+        value = 0
+        for i in row:
+            value ^= bits[i]
+        result.append(value)
+    return result
+
+def multiply(a: list, b: list) -> list:
+    """Multiply two sets of 8 bit slices in GF(2^8)."""
+    product = [0] * 15
+    for i in range(8):
+        ai = a[i]
+        for j in range(8):
+            product[i + j] ^= ai & b[j]
+
+    # reduce by x^8 = x^4 + x^3 + x + 1
+    for k in range(14, 7, -1):
+        pk = product[k]
+        product[k - 4] ^= pk
+        product[k - 5] ^= pk
+        product[k - 7] ^= pk
+        product[k - 8] ^= pk
+    return product[:8]
+
+def invert(x: list) -> list:
+    """Invert 8 bit slices in GF(2^8) as x^254 (4 multiplications, everything else linear)."""
+    x2 = linear(SQUARE, x)
+    x3 = multiply(x2, x)
+    x12 = linear(POWER4, x3)
+    x15 = multiply(x12, x3)
+    x240 = linear(POWER16, x15)
+    x252 = multiply(x240, x12)
+    return multiply(x252, x2)
+
+def add_constant(bits: list, constant: int, mask: int) -> list:
+    """XOR a byte constant into 8 bit slices."""
+    return [bit ^ (mask & -((constant >> j) & 1)) for j, bit in enumerate(bits)]
+
+def sub_bytes(bits: list, mask: int) -> list:
+    """Boolean circuit for the sbox on 8 bit slices."""
+    return add_constant(linear(AFFINE, invert(bits)), SBOX_CONSTANT, mask)
+
+def sub_bytes_inv(bits: list, mask: int) -> list:
+    """Boolean circuit for the inverse sbox on 8 bit slices."""
+    return invert(add_constant(linear(AFFINE_INV, bits), SBOX_INV_CONSTANT, mask))
+
+def xtime(a: list) -> list:
+    """Multiply 8 bit slices by x (2) in GF(2^8)."""
+    return [a[7], a[0] ^ a[7], a[1], a[2] ^ a[7], a[3] ^ a[7], a[4], a[5], a[6]]
+
+def xor_slices(a: list, b: list) -> list:
+    return [i ^ j for i, j in zip(a, b)]
+
+def mix_columns(state: list, inverse=False) -> list:
+    """Apply mix columns to 16 bytes of bit slices."""
+    mixed = []
+    for index in range(0, 16, 4):
+        a0, a1, a2, a3 = state[index: index + 4]
+
+        if inverse: # inverse mix columns is a pre-multiplication followed by the forward mix columns
+            u = xtime(xtime(xor_slices(a0, a2)))
+            v = xtime(xtime(xor_slices(a1, a3)))
+            a0, a1, a2, a3 = xor_slices(a0, u), xor_slices(a1, v), xor_slices(a2, u), xor_slices(a3, v)
+
+        t = [w ^ x ^ y ^ z for w, x, y, z in zip(a0, a1, a2, a3)]
+        mixed.append([w ^ x ^ y for w, x, y in zip(a0, t, xtime(xor_slices(a0, a1)))])
+        mixed.append([w ^ x ^ y for w, x, y in zip(a1, t, xtime(xor_slices(a1, a2)))])
+        mixed.append([w ^ x ^ y for w, x, y in zip(a2, t, xtime(xor_slices(a2, a3)))])
+        mixed.append([w ^ x ^ y for w, x, y in zip(a3, t, xtime(xor_slices(a3, a0)))])
+    return mixed
+
+## ENGINE ##
+class BitsliceEngine:
+    batch_size = 16384 # blocks per batch (256 KiB), the width in bits of every slice
+
+    def __init__(self, expanded_key: list, rounds: int) -> None:
+        self.rounds = rounds
+        # 16 round key bytes per round from the existing key schedule
+        self.round_keys = [sum((list(word_block) for word_block in expanded_key[4 * index: 4 * (index + 1)]), []) for index in range(rounds + 1)]
+        self.key_slices = {} # round keys spread across every block, for full batches and the last other width only
+
+    def round_key_slices(self, width: int) -> list:
+        """Round keys as bit slices for a batch of the given width (all ones or all zeros per slice).
+        Engines are shared through the key cache, so at most two widths are kept however many input sizes it sees."""
+        if width not in self.key_slices:
+            if width != self.batch_size:
+                self.key_slices = {self.batch_size: self.key_slices[self.batch_size]} if self.batch_size in self.key_slices else {}
+            mask = (1 << width) - 1
+            self.key_slices[width] = [[add_constant([0] * 8, byte, mask) for byte in round_key] for round_key in self.round_keys]
+        return self.key_slices[width]
+
+    @staticmethod
+    def pack(data: bytes) -> list:
+        """Transpose blocks into 16 bytes x 8 bits of slices, bit n of each slice belongs to block n."""
+        state = []
+        for index in range(16):
+            column = data[index::16] # byte index of every block
+            state.append([int(column.translate(BIT_CHARS[j])[::-1], 2) for j in range(8)])
+        return state
+
+    @staticmethod
+    def unpack(state: list, width: int) -> bytes:
+        """Transpose 16 bytes x 8 bits of slices back into concatenated blocks."""
+        blocks = bytearray(16 * width)
+        for index in range(16):
+            value = 0
+            for j in range(8): # bits of a byte never overlap so adding them is OR-ing them
+                value += int.from_bytes(format(state[index][j], f"0{width}b").encode().translate(BIT_VALUES[j]), "big")
+            blocks[index::16] = value.to_bytes(width, "big")[::-1]
+        return bytes(blocks)
+
+    def encrypt_batch(self, data: bytes) -> bytes:
+        """Encrypt up to batch_size concatenated blocks in one pass of the circuit."""
+        width = len(data) // 16
+        mask = (1 << width) - 1
+        keys = self.round_key_slices(width)
+        state = [xor_slices(byte, key) for byte, key in zip(self.pack(data), keys[0])] # initial round (just add_round)
+
+        for index in range(1, self.rounds + 1):
+            state = [sub_bytes(state[SHIFT[i]], mask) for i in range(16)] # shift rows and sub bytes
+            if index != self.rounds: # final round (all but mix_columns)
+                state = mix_columns(state)
+            state = [xor_slices(byte, key) for byte, key in zip(state, keys[index])] # add round
+
+        return self.unpack(state, width)
+
+    def decrypt_batch(self, data: bytes) -> bytes:
+        """Decrypt up to batch_size concatenated blocks in one pass of the circuit."""
+        width = len(data) // 16
+        mask = (1 << width) - 1
+        keys = self.round_key_slices(width)
+        state = [xor_slices(byte, key) for byte, key in zip(self.pack(data), keys[self.rounds])] # initial round (just add_round)
+
+        for index in range(self.rounds - 1, -1, -1):
+            state = [sub_bytes_inv(state[SHIFT_INV[i]], mask) for i in range(16)] # inverse shift rows and inverse sub bytes
+            state = [xor_slices(byte, key) for byte, key in zip(state, keys[index])] # add round
+            if index != 0: # final round (all but inverse mix_columns)
+                state = mix_columns(state, inverse=True)
+
+        return self.unpack(state, width)
+
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Encrypt concatenated 16 byte blocks."""
+        step = 16 * self.batch_size
+        return b"".join(self.encrypt_batch(data[index: index + step]) for index in range(0, len(data), step))
+
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Decrypt concatenated 16 byte blocks."""
+        step = 16 * self.batch_size
+        return b"".join(self.decrypt_batch(data[index: index + step]) for index in range(0, len(data), step))
+
+    def encrypt_block(self, text: bytes) -> bytes:
+        """Encrypt a 16 byte block (a batch of one)."""
+        return self.encrypt_batch(text)
+
+    def decrypt_block(self, text: bytes) -> bytes:
+        """Decrypt a 16 byte block (a batch of one)."""
+        return self.decrypt_batch(text)
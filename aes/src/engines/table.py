@@ -0,0 +1,98 @@
+from aes.src.utils import SBOX, SBOX_INV, galois
+
+## TABLES ##
+def build_tables(sbox: tuple, coefficients: tuple) -> tuple:
+    """Build the four combined SubBytes/ShiftRows/MixColumns word tables."""
+    c0, c1, c2, c3 = coefficients
+    table0 = tuple((galois(s, c0) << 24) | (galois(s, c1) << 16) | (galois(s, c2) << 8) | galois(s, c3) for s in sbox)
+    table1 = tuple(((w >> 8) | (w << 24)) & 0xFFFFFFFF for w in table0) # each table is the previous rotated one byte right
+    table2 = tuple(((w >> 8) | (w << 24)) & 0xFFFFFFFF for w in table1)
+    table3 = tuple(((w >> 8) | (w << 24)) & 0xFFFFFFFF for w in table2)
+    return table0, table1, table2, table3
+
+TE0, TE1, TE2, TE3 = build_tables(SBOX, (2, 1, 1, 3)) # encryption tables
+TD0, TD1, TD2, TD3 = build_tables(SBOX_INV, (0xE, 0x9, 0xD, 0xB)) # decryption tables
+
+## ENGINE ##
+class TableEngine:
+    def __init__(self, expanded_key: list, rounds: int) -> None:
+        self.rounds = rounds
+        self.encrypt_key = [int.from_bytes(bytes(word_block), "big") for word_block in expanded_key] # 32-bit round key words
+        self.decrypt_key = self.inverse_key_schedule(self.encrypt_key, rounds)
+
+    @staticmethod
+    def inverse_key_schedule(encrypt_key: list, rounds: int) -> list:
+        """Build the equivalent inverse cipher key (reversed rounds, inner rounds passed through inverse mix columns)."""
+        decrypt_key = []
+        for index in range(rounds, -1, -1):
+            for word in encrypt_key[4 * index: 4 * (index + 1)]:
+                if 0 < index < rounds: # TD[SBOX[b]] undoes the sub bytes, leaving just inverse mix columns
+                    word = TD0[SBOX[word >> 24]] ^ TD1[SBOX[(word >> 16) & 0xFF]] ^ TD2[SBOX[(word >> 8) & 0xFF]] ^ TD3[SBOX[word & 0xFF]]
+                decrypt_key.append(word)
+        return decrypt_key
+
+    def encrypt_block(self, text: bytes) -> bytes:
+        """Encrypt a 16 byte block using 32-bit table lookups."""
+        te0, te1, te2, te3, key = TE0, TE1, TE2, TE3, self.encrypt_key
+        state = int.from_bytes(text, "big")
+
+        # Initial round (just add_round)
+        s0 = (state >> 96) ^ key[0]
+        s1 = ((state >> 64) & 0xFFFFFFFF) ^ key[1]
+        s2 = ((state >> 32) & 0xFFFFFFFF) ^ key[2]
+        s3 = (state & 0xFFFFFFFF) ^ key[3]
+
+        # Main encryption loop (sub bytes, shift rows and mix columns are all in the tables)
+        for index in range(4, 4 * self.rounds, 4):
+            t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ key[index]
+            t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ key[index + 1]
+            t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ key[index + 2]
+            s3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ key[index + 3]
+            s0, s1, s2 = t0, t1, t2
+
+        # Final round (all but mix_columns)
+        index = 4 * self.rounds
+        t0 = ((SBOX[s0 >> 24] << 24) | (SBOX[(s1 >> 16) & 0xFF] << 16) | (SBOX[(s2 >> 8) & 0xFF] << 8) | SBOX[s3 & 0xFF]) ^ key[index]
+        t1 = ((SBOX[s1 >> 24] << 24) | (SBOX[(s2 >> 16) & 0xFF] << 16) | (SBOX[(s3 >> 8) & 0xFF] << 8) | SBOX[s0 & 0xFF]) ^ key[index + 1]
+        t2 = ((SBOX[s2 >> 24] << 24) | (SBOX[(s3 >> 16) & 0xFF] << 16) | (SBOX[(s0 >> 8) & 0xFF] << 8) | SBOX[s1 & 0xFF]) ^ key[index + 2]
+        t3 = ((SBOX[s3 >> 24] << 24) | (SBOX[(s0 >> 16) & 0xFF] << 16) | (SBOX[(s1 >> 8) & 0xFF] << 8) | SBOX[s2 & 0xFF]) ^ key[index + 3]
+
+        return ((t0 << 96) | (t1 << 64) | (t2 << 32) | t3).to_bytes(16, "big")
+
+    def decrypt_block(self, text: bytes) -> bytes:
+        """Decrypt a 16 byte block using 32-bit table lookups (equivalent inverse cipher)."""
+        td0, td1, td2, td3, key = TD0, TD1, TD2, TD3, self.decrypt_key
+        state = int.from_bytes(text, "big")
+
+        # Initial round (just add_round with the last round key)
+        s0 = (state >> 96) ^ key[0]
+        s1 = ((state >> 64) & 0xFFFFFFFF) ^ key[1]
+        s2 = ((state >> 32) & 0xFFFFFFFF) ^ key[2]
+        s3 = (state & 0xFFFFFFFF) ^ key[3]
+
+        # Main decryption loop (inverse sub bytes, shift rows and mix columns are all in the tables)
+        for index in range(4, 4 * self.rounds, 4):
+            t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ key[index]
+            t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ key[index + 1]
+            t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ key[index + 2]
+            s3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ key[index + 3]
+            s0, s1, s2 = t0, t1, t2
+
+        # Final round (all but inverse mix_columns)
+        index = 4 * self.rounds
+        t0 = ((SBOX_INV[s0 >> 24] << 24) | (SBOX_INV[(s3 >> 16) & 0xFF] << 16) | (SBOX_INV[(s2 >> 8) & 0xFF] << 8) | SBOX_INV[s1 & 0xFF]) ^ key[index]
+        t1 = ((SBOX_INV[s1 >> 24] << 24) | (SBOX_INV[(s0 >> 16) & 0xFF] << 16) | (SBOX_INV[(s3 >> 8) & 0xFF] << 8) | SBOX_INV[s2 & 0xFF]) ^ key[index + 1]
+        t2 = ((SBOX_INV[s2 >> 24] << 24) | (SBOX_INV[(s1 >> 16) & 0xFF] << 16) | (SBOX_INV[(s0 >> 8) & 0xFF] << 8) | SBOX_INV[s3 & 0xFF]) ^ key[index + 2]
+        t3 = ((SBOX_INV[s3 >> 24] << 24) | (SBOX_INV[(s2 >> 16) & 0xFF] << 16) | (SBOX_INV[(s1 >> 8) & 0xFF] << 8) | SBOX_INV[s0 & 0xFF]) ^ key[index + 3]
+
+        return ((t0 << 96) | (t1 << 64) | (t2 << 32) | t3).to_bytes(16, "big")
+
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Encrypt concatenated 16 byte blocks."""
+        encrypt_block = self.encrypt_block
+        return b"".join(encrypt_block(data[index: index + 16]) for index in range(0, len(data), 16))
+
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Decrypt concatenated 16 byte blocks."""
+        decrypt_block = self.decrypt_block
+        return b"".join(decrypt_block(data[index: index + 16]) for index in range(0, len(data), 16))
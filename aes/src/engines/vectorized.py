@@ -0,0 +1,90 @@
+try:
+    import numpy as np
+except ImportError: # numpy is optional, the other engines are pure python
+    np = None
+
+from aes.src.utils import SBOX, SBOX_INV
+
+## ENGINE ##
+class NumpyEngine:
+    batch_size = 65536 # blocks per batch (1 MiB), keeps temporary arrays small
+
+    def __init__(self, expanded_key: list, rounds: int) -> None:
+        if np is None:
+            raise ImportError("The numpy engine requires NumPy (pip install numpy).")
+        self.rounds = rounds
+        # one row of 16 bytes per round key, broadcast over every block in a batch
+        self.round_keys = np.array([sum((list(word_block) for word_block in expanded_key[4 * index: 4 * (index + 1)]), []) for index in range(rounds + 1)], dtype=np.uint8)
+
+        self.sbox = np.array(SBOX, dtype=np.uint8)
+        self.sbox_inv = np.array(SBOX_INV, dtype=np.uint8)
+        self.xtime = np.array([((b << 1) ^ 0x1B) & 0xFF if b & 0x80 else b << 1 for b in range(256)], dtype=np.uint8)
+
+        # state byte i sits in column i // 4, row i % 4, shift rows moves row r left by r columns
+        self.shift = np.array([4 * ((index // 4 + index % 4) % 4) + index % 4 for index in range(16)])
+        self.shift_inv = np.array([4 * ((index // 4 - index % 4) % 4) + index % 4 for index in range(16)])
+
+    def mix_columns(self, state, inverse=False):
+        """Apply mix columns to every column of every block at once."""
+        columns = state.reshape(-1, 4, 4)
+        a0, a1, a2, a3 = columns[:, :, 0], columns[:, :, 1], columns[:, :, 2], columns[:, :, 3]
+
+        if inverse: # inverse mix columns is a pre-multiplication followed by the forward mix columns
+            u = self.xtime[self.xtime[a0 ^ a2]]
+            v = self.xtime[self.xtime[a1 ^ a3]]
+            a0, a1, a2, a3 = a0 ^ u, a1 ^ v, a2 ^ u, a3 ^ v
+
+        t = a0 ^ a1 ^ a2 ^ a3
+        mixed = np.empty_like(columns)
+        mixed[:, :, 0] = a0 ^ t ^ self.xtime[a0 ^ a1]
+        mixed[:, :, 1] = a1 ^ t ^ self.xtime[a1 ^ a2]
+        mixed[:, :, 2] = a2 ^ t ^ self.xtime[a2 ^ a3]
+        mixed[:, :, 3] = a3 ^ t ^ self.xtime[a3 ^ a0]
+        return mixed.reshape(-1, 16)
+
+    def encrypt_batch(self, state):
+        """Encrypt an N x 16 uint8 array of blocks."""
+        state = state ^ self.round_keys[0] # initial round (just add_round)
+
+        for index in range(1, self.rounds):
+            state = self.sbox[state[:, self.shift]] # shift rows and sub bytes
+            state = self.mix_columns(state) # mix columns
+            state ^= self.round_keys[index] # add round
+
+        state = self.sbox[state[:, self.shift]] # final round (all but mix_columns)
+        state ^= self.round_keys[self.rounds]
+        return state
+
+    def decrypt_batch(self, state):
+        """Decrypt an N x 16 uint8 array of blocks."""
+        state = state ^ self.round_keys[self.rounds] # initial round (all but mix_columns)
+        state = self.sbox_inv[state[:, self.shift_inv]]
+
+        for index in range(self.rounds - 1, 0, -1):
+            state ^= self.round_keys[index] # add round
+            state = self.mix_columns(state, inverse=True) # inverse mix columns
+            state = self.sbox_inv[state[:, self.shift_inv]] # inverse shift rows and inverse sub bytes
+
+        state ^= self.round_keys[0] # final round (just add_round)
+        return state
+
+    def run_blocks(self, data: bytes, batch) -> bytes:
+        """Run a batch function over concatenated 16 byte blocks."""
+        blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+        return b"".join(batch(blocks[index: index + self.batch_size]).tobytes() for index in range(0, len(blocks), self.batch_size))
+
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Encrypt concatenated 16 byte blocks."""
+        return self.run_blocks(data, self.encrypt_batch)
+
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Decrypt concatenated 16 byte blocks."""
+        return self.run_blocks(data, self.decrypt_batch)
+
+    def encrypt_block(self, text: bytes) -> bytes:
+        """Encrypt a 16 byte block."""
+        return self.encrypt_blocks(text)
+
+    def decrypt_block(self, text: bytes) -> bytes:
+        """Decrypt a 16 byte block."""
+        return self.decrypt_blocks(text)
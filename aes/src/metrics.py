@@ -0,0 +1,112 @@
+import functools, json, math, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from aes.src.cache import KEY_CACHE
+
+## METRICS ##
+BUCKETS_PER_DOUBLING = 4 # latency buckets grow by 2^(1/4) (~19%), from 1 microsecond to ~30 seconds
+BUCKET_COUNT = 25 * BUCKETS_PER_DOUBLING
+
+class Histogram:
+    """Fixed log scale latency histogram, recording is O(1) and memory never grows."""
+    def __init__(self) -> None:
+        self.counts = [0] * BUCKET_COUNT
+
+    def record(self, seconds: float) -> None:
+        microseconds = seconds * 1e6
+        index = int(BUCKETS_PER_DOUBLING * math.log2(microseconds)) + 1 if microseconds > 1 else 0
+        self.counts[min(index, BUCKET_COUNT - 1)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound (milliseconds) of the bucket holding the q-th percentile."""
+        target = q / 100 * sum(self.counts)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return 2 ** (index / BUCKETS_PER_DOUBLING) / 1000
+        return 0.0
+
+class Metrics:
+    def __init__(self, enabled=False) -> None:
+        self.enabled = enabled # checked before any timing happens, disabled costs one attribute lookup
+        self.lock = threading.Lock()
+        self.series = {} # (operation, mode, key_bits) -> [count, bytes, seconds, Histogram]
+        self.sources = {} # name -> function returning extra json-able stats for the snapshot (e.g. chat queue depths)
+
+    def record(self, operation: str, mode: str, key_bits: int, size: int, seconds: float) -> None:
+        with self.lock:
+            series = self.series.get((operation, mode, key_bits))
+            if series is None:
+                series = self.series[(operation, mode, key_bits)] = [0, 0, 0.0, Histogram()]
+            series[0] += 1
+            series[1] += size
+            series[2] += seconds
+            series[3].record(seconds)
+
+    def register(self, name: str, source) -> None:
+        """Include source() in every snapshot under name."""
+        self.sources[name] = source
+
+    def snapshot(self) -> dict:
+        """Counters, byte totals and p50/p99 latency for every operation, mode and key size."""
+        with self.lock:
+            operations = [{
+                "operation": operation, "mode": mode, "key_bits": key_bits,
+                "count": count, "bytes": size, "seconds": round(seconds, 6),
+                "p50_ms": round(histogram.percentile(50), 4), "p99_ms": round(histogram.percentile(99), 4),
+            } for (operation, mode, key_bits), (count, size, seconds, histogram) in sorted(self.series.items())]
+        snapshot = {"enabled": self.enabled, "operations": operations, "key_cache": KEY_CACHE.stats()}
+        for name, source in list(self.sources.items()):
+            snapshot[name] = source()
+        return snapshot
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4)
+
+    def dump(self, path: str) -> None:
+        """Write the snapshot to a json file."""
+        with open(path, "w") as FILE:
+            FILE.write(self.to_json())
+
+    def reset(self) -> None:
+        with self.lock:
+            self.series.clear()
+
+    def serve(self, host="127.0.0.1", port=9100) -> ThreadingHTTPServer:
+        """Serve the snapshot as json over http from a background thread so a running process can be scraped."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = metrics.to_json().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass # keep scrapes out of the app's output
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+# process-wide metrics, turned on with AES_METRICS=1 (or METRICS.enabled = True)
+METRICS = Metrics(os.environ.get("AES_METRICS", "") not in ("", "0"))
+
+def timed(operation: str, describe=None):
+    """Record latency of an AES method when metrics are enabled. describe(self, *args, **kwargs) -> (mode, bytes)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not METRICS.enabled:
+                return func(self, *args, **kwargs)
+            start_time = time.perf_counter()
+            result = func(self, *args, **kwargs)
+            execution_time = time.perf_counter() - start_time
+            mode, size = describe(self, *args, **kwargs) if describe is not None else ("-", 0)
+            METRICS.record(operation, mode, 8 * len(self.key), size, execution_time)
+            return result
+        return wrapper
+    return decorator
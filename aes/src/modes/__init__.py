@@ -0,0 +1,3 @@
+from aes.src.modes.ctr import ctr, keystream
+from aes.src.modes.gcm import GCM, ghash_tables
+from aes.src.modes.stream import Encryptor, Decryptor, MODES
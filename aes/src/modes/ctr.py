@@ -0,0 +1,37 @@
+from aes.src.utils import xor_bytes
+
+## CTR ##
+BATCH_BLOCKS = 4096 # keystream blocks generated per engine call (64 KiB)
+
+def to_nonce(nonce) -> bytes:
+    """Accepts a str or bytes nonce (8 to 12 bytes, the rest of the block is the counter)."""
+    nonce = nonce.encode("utf-8") if isinstance(nonce, str) else bytes(nonce)
+    assert 8 <= len(nonce) <= 12, "Invalid nonce length. CTR allows nonces of 8 to 12 bytes."
+    return nonce
+
+def keystream(aes, nonce: bytes, start: int, count: int) -> bytes:
+    """Encrypts count counter blocks (nonce || counter) starting at block number start in one batch."""
+    counter_bits = 8 * (16 - len(nonce))
+    prefix = int.from_bytes(nonce, "big") << counter_bits
+    mask = (1 << counter_bits) - 1 # the counter wraps inside its own bytes, the nonce never changes
+    counters = b"".join((prefix | (counter & mask)).to_bytes(16, "big") for counter in range(start, start + count))
+    return aes.encrypt_blocks(counters)
+
+def ctr(aes, data: bytes, nonce, offset=0, initial=0) -> bytes:
+    """XOR data with the keystream starting at byte offset (encryption and decryption are the same). initial is the counter of byte 0."""
+    nonce = to_nonce(nonce)
+    first_block, skip = divmod(offset, 16) # any offset maps straight to a counter, no earlier blocks needed
+    total_blocks = (skip + len(data) + 15) // 16
+    assert first_block + total_blocks <= 1 << 8 * (16 - len(nonce)), "CTR counter overflow. Use a longer counter (shorter nonce)."
+
+    output = bytearray()
+    position = 0
+    for batch in range(0, total_blocks, BATCH_BLOCKS):
+        stream = keystream(aes, nonce, initial + first_block + batch, min(BATCH_BLOCKS, total_blocks - batch))
+        if batch == 0:
+            stream = stream[skip:] # drop the part of the first block before offset
+        piece = data[position: position + len(stream)]
+        output += xor_bytes(piece, stream[:len(piece)])
+        position += len(piece)
+
+    return bytes(output)
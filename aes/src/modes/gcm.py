@@ -0,0 +1,98 @@
+import hmac
+from aes.src.modes.ctr import ctr
+
+## GHASH ##
+R = 0xE1 << 120 # GCM reduction polynomial (x^128 + x^7 + x^2 + x + 1, bit reflected)
+
+def ghash_tables(h: bytes) -> list:
+    """Precompute 8-bit Shoup tables for multiplying by H, table[p][b] = (b at byte position p) * H."""
+    # H * x^i for every bit position i, bit 0 is the most significant bit of the block
+    powers = [int.from_bytes(h, "big")]
+    for _ in range(127):
+        v = powers[-1]
+        powers.append((v >> 1) ^ R if v & 1 else v >> 1)
+
+    tables = []
+    for position in range(16):
+        table = [0] * 256
+        for byte in range(1, 256):
+            low = byte & -byte # lowest set bit, every other entry is already built
+            table[byte] = table[byte ^ low] ^ powers[8 * position + 8 - low.bit_length()]
+        tables.append(table)
+    return tables
+
+def ghash(tables: list, state: int, data: bytes) -> int:
+    """Fold whole 16 byte blocks of data into the GHASH state using the tables (16 lookups per block)."""
+    t = tables
+    for index in range(0, len(data), 16):
+        block = (state ^ int.from_bytes(data[index: index + 16], "big")).to_bytes(16, "big")
+        state = (t[0][block[0]] ^ t[1][block[1]] ^ t[2][block[2]] ^ t[3][block[3]] ^
+                 t[4][block[4]] ^ t[5][block[5]] ^ t[6][block[6]] ^ t[7][block[7]] ^
+                 t[8][block[8]] ^ t[9][block[9]] ^ t[10][block[10]] ^ t[11][block[11]] ^
+                 t[12][block[12]] ^ t[13][block[13]] ^ t[14][block[14]] ^ t[15][block[15]])
+    return state
+
+def zero_pad(data: bytes) -> bytes:
+    return data + bytes(-len(data) % 16)
+
+## GCM ##
+class GCM:
+    def __init__(self, aes, nonce, associated_data=b"") -> None:
+        nonce = nonce.encode("utf-8") if isinstance(nonce, str) else bytes(nonce)
+        assert len(nonce) > 0, "GCM requires a nonce (12 bytes recommended)."
+        self.aes = aes
+        self.tables = aes.ghash_tables() # built once per key
+
+        # pre-counter block, 96-bit nonces are used directly and anything else is hashed
+        if len(nonce) == 12:
+            j0 = nonce + b"\x00\x00\x00\x01"
+        else:
+            j0 = ghash(self.tables, 0, zero_pad(nonce) + (8 * len(nonce)).to_bytes(16, "big")).to_bytes(16, "big")
+        self.counter_nonce = j0[:12] # the last 32 bits are the counter
+        self.counter_start = int.from_bytes(j0[12:], "big") + 1 # first counter used for data
+        self.tag_mask = aes.encrypt_block(j0) # encrypted pre-counter block masks the tag
+
+        associated_data = associated_data.encode("utf-8") if isinstance(associated_data, str) else bytes(associated_data)
+        self.associated_length = len(associated_data)
+        self.state = ghash(self.tables, 0, zero_pad(associated_data))
+        self.buffer = b"" # ciphertext not yet hashed (less than one block)
+        self.length = 0 # bytes of data processed
+        self.tag = None
+
+    def hash_ciphertext(self, data: bytes) -> None:
+        """Feed ciphertext into GHASH, keeping any partial block for the next call."""
+        data = self.buffer + data
+        whole = len(data) - len(data) % 16
+        self.state = ghash(self.tables, self.state, data[:whole])
+        self.buffer = data[whole:]
+
+    def crypt(self, data: bytes) -> bytes:
+        """XOR data with the keystream at the current position."""
+        assert self.tag is None, "GCM message already finalized."
+        output = ctr(self.aes, data, self.counter_nonce, self.length, self.counter_start)
+        self.length += len(data)
+        return output
+
+    def encrypt(self, data: bytes) -> bytes:
+        """Encrypt the next piece of the message."""
+        output = self.crypt(data)
+        self.hash_ciphertext(output)
+        return output
+
+    def decrypt(self, data: bytes) -> bytes:
+        """Decrypt the next piece of the message. Plaintext must not be trusted until verify() passes."""
+        self.hash_ciphertext(bytes(data))
+        return self.crypt(data)
+
+    def finalize(self) -> bytes:
+        """Finish the message and return the 16 byte authentication tag."""
+        if self.tag is None:
+            lengths = (8 * self.associated_length).to_bytes(8, "big") + (8 * self.length).to_bytes(8, "big")
+            state = ghash(self.tables, self.state, zero_pad(self.buffer) + lengths)
+            self.tag = (state ^ int.from_bytes(self.tag_mask, "big")).to_bytes(16, "big")
+        return self.tag
+
+    def verify(self, tag: bytes) -> None:
+        """Finish the message and check the tag, raises ValueError when the message was tampered with."""
+        if not hmac.compare_digest(self.finalize(), bytes(tag)):
+            raise ValueError("GCM authentication failed. The message or associated data was modified (or the key/nonce differs).")
@@ -0,0 +1,109 @@
+from aes.src.utils import pkcs7_padding, pkcs7_padding_undo, xor_bytes
+from aes.src.modes.ctr import ctr
+
+## STREAM ##
+MODES = ("ecb", "cbc", "ctr", "gcm")
+
+def to_iv(aes, mode: str, iv) -> bytes:
+    """Fetch the iv (cbc) or nonce (ctr, gcm) as bytes."""
+    if iv is None:
+        assert mode in ("ecb", "cbc"), f"{mode.upper()} requires a nonce."
+        return aes.default_iv if mode == "cbc" else None
+    return iv.encode("utf-8") if isinstance(iv, str) else bytes(iv)
+
+class Encryptor:
+    def __init__(self, aes, mode="ecb", iv=None) -> None:
+        assert mode in MODES, f"Invalid mode. AES allows {', '.join(MODES)} modes."
+        self.aes = aes
+        self.mode = mode
+        self.iv = to_iv(aes, mode, iv)
+        self.previous = self.iv # cbc chaining state
+        self.buffer = b"" # partial block waiting for more data (ecb, cbc)
+        self.length = 0 # bytes processed (ctr)
+        self.message = aes.gcm(self.iv) if mode == "gcm" else None
+
+    def update(self, data: bytes) -> bytes:
+        """Encrypt the next piece of data, returning every whole block available so far."""
+        if self.mode == "ctr":
+            output = ctr(self.aes, data, self.iv, self.length)
+            self.length += len(data)
+            return output
+        if self.mode == "gcm":
+            return self.message.encrypt(data)
+
+        data = self.buffer + data
+        whole = len(data) - len(data) % 16
+        self.buffer = data[whole:]
+        return self.encrypt_whole(data[:whole])
+
+    def encrypt_whole(self, data: bytes) -> bytes:
+        """Encrypt whole blocks in ecb (one batch) or cbc (chained)."""
+        if self.mode == "ecb":
+            return self.aes.encrypt_blocks(data)
+
+        encrypted_chunks = []
+        previous = self.previous
+        for index in range(0, len(data), 16):
+            previous = self.aes.encrypt_block(xor_bytes(data[index: index + 16], previous)) # encrypt chunk
+            encrypted_chunks.append(previous)
+        self.previous = previous
+        return b"".join(encrypted_chunks)
+
+    def finalize(self) -> bytes:
+        """Pad and encrypt the last partial block (ecb, cbc) or return the tag (gcm)."""
+        if self.mode == "ctr":
+            return b""
+        if self.mode == "gcm":
+            return self.message.finalize()
+
+        padded_text = pkcs7_padding(self.buffer) # Adds padding
+        self.buffer = b""
+        return self.encrypt_whole(padded_text)
+
+class Decryptor:
+    def __init__(self, aes, mode="ecb", iv=None) -> None:
+        assert mode in MODES, f"Invalid mode. AES allows {', '.join(MODES)} modes."
+        self.aes = aes
+        self.mode = mode
+        self.iv = to_iv(aes, mode, iv)
+        self.previous = self.iv # cbc chaining state
+        self.buffer = b"" # held back data, the last block may be padding (ecb, cbc) and the last 16 bytes are the tag (gcm)
+        self.length = 0 # bytes processed (ctr)
+        self.message = aes.gcm(self.iv) if mode == "gcm" else None
+
+    def update(self, data: bytes) -> bytes:
+        """Decrypt the next piece of data, holding back only what finalize() needs."""
+        if self.mode == "ctr":
+            output = ctr(self.aes, data, self.iv, self.length)
+            self.length += len(data)
+            return output
+
+        data = self.buffer + data
+        if self.mode == "gcm": # plaintext must not be trusted until finalize() verifies the tag
+            self.buffer = data[-16:]
+            return self.message.decrypt(data[:-16])
+
+        whole = max(len(data) - len(data) % 16 - 16, 0) # keep the last whole block in case it is padding
+        self.buffer = data[whole:]
+        return self.decrypt_whole(data[:whole])
+
+    def decrypt_whole(self, data: bytes) -> bytes:
+        """Decrypt whole blocks as one batch (every block decrypts independently, even in cbc)."""
+        decrypted_text = self.aes.decrypt_blocks(data)
+        if self.mode == "cbc" and data:
+            decrypted_text = xor_bytes(decrypted_text, self.previous + data[:-16])
+            self.previous = data[-16:]
+        return decrypted_text
+
+    def finalize(self) -> bytes:
+        """Decrypt and unpad the held back block (ecb, cbc) or verify the tag (gcm, raises ValueError)."""
+        if self.mode == "ctr":
+            return b""
+        if self.mode == "gcm":
+            self.message.verify(self.buffer)
+            return b""
+
+        assert len(self.buffer) % 16 == 0, "Invalid ciphertext length. ECB and CBC ciphertext is a multiple of 16 bytes."
+        decrypted_text = self.decrypt_whole(self.buffer)
+        self.buffer = b""
+        return pkcs7_padding_undo(decrypted_text) if decrypted_text else decrypted_text # Undo any added padding
@@ -0,0 +1,128 @@
+import atexit, multiprocessing, os
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from aes.src.aes import AES
+from aes.src.cache import KEY_CACHE
+from aes.src.compression import compress as compress_bytes, decompress as decompress_bytes
+from aes.src.modes import ctr
+from aes.src.utils import pkcs7_padding, pkcs7_padding_undo, xor_bytes
+
+## WORKERS ##
+WORKER = None # AES object of this worker process, built once by the pool initializer
+
+def start_worker(key, engine: str, expanded_key: list, rounds: int) -> None:
+    """Seed the worker's key cache with the parent's expanded key so the key is never expanded again."""
+    global WORKER
+    key_bytes = key.encode("utf-8") if isinstance(key, str) else bytes(key)
+    KEY_CACHE.get(key_bytes, lambda: (expanded_key, rounds))
+    WORKER = AES(key, engine)
+
+def run_chunk(task: tuple) -> None:
+    """Process bytes [start, end) of the shared input into the same range of the shared output."""
+    operation, input_name, output_name, start, end, extra = task
+    source, target = SharedMemory(input_name), SharedMemory(output_name)
+    try:
+        data = bytes(source.buf[start: end])
+        if operation == "encrypt_blocks":
+            result = WORKER.encrypt_blocks(data)
+        elif operation == "decrypt_blocks":
+            result = WORKER.decrypt_blocks(data)
+        elif operation == "cbc_decrypt": # the previous ciphertext block is read from the input, no chaining between workers
+            previous = extra if start == 0 else bytes(source.buf[start - 16: start])
+            result = xor_bytes(WORKER.decrypt_blocks(data), previous + data[:-16])
+        else: # ctr, extra is (nonce, offset of byte 0)
+            nonce, offset = extra
+            result = ctr(WORKER, data, nonce, offset + start)
+        target.buf[start: end] = result
+    finally:
+        source.close()
+        target.close()
+
+## PARALLEL AES ##
+class ParallelAES:
+    """AES spread over a persistent process pool. ECB, CTR and CBC decryption run in parallel, everything else runs here."""
+    min_size = 1 << 20 # smaller inputs stay in this process, the pool round trip costs more than it saves
+    chunk_size = 1 << 20 # bytes per task (multiple of 16)
+
+    def __init__(self, key, engine="standard", processes=None) -> None:
+        self.aes = AES(key, engine) # single process path, also validates the key and engine
+        self.key = key
+        self.processes = processes or os.cpu_count() or 1
+        self.pool = None # started on the first large input
+
+    def start(self) -> None:
+        if self.pool is None:
+            resource_tracker.ensure_running() # workers share the parent's tracker, otherwise each one reports the buffers as leaked
+            arguments = (self.key, self.aes.engine_name, self.aes.expanded_key, self.aes.rounds)
+            self.pool = multiprocessing.Pool(self.processes, initializer=start_worker, initargs=arguments)
+            atexit.register(self.close) # one handler per running pool, close() removes it
+
+    def close(self) -> None:
+        """Stop the worker pool (it restarts on the next large input)."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            atexit.unregister(self.close)
+
+    def __enter__(self) -> "ParallelAES":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def run(self, operation: str, data: bytes, extra=None) -> bytes:
+        """Split data into aligned chunks and let the workers process them through shared memory."""
+        self.start()
+        size = len(data)
+        source, target = SharedMemory(create=True, size=size), SharedMemory(create=True, size=size)
+        try:
+            source.buf[:size] = data
+            tasks = [(operation, source.name, target.name, start, min(start + self.chunk_size, size), extra) for start in range(0, size, self.chunk_size)]
+            self.pool.map(run_chunk, tasks)
+            return bytes(target.buf[:size])
+        finally:
+            for memory in (source, target):
+                memory.close()
+                memory.unlink()
+
+    def encrypt(self, text: str, cbc=False, iv=None, compress=False) -> bytes:
+        """Same as AES.encrypt. ECB runs in parallel, CBC encryption is sequential and runs in this process."""
+        data = text.encode("utf-8")
+        if cbc or len(data) < self.min_size:
+            return self.aes.encrypt(text, cbc, iv, compress)
+        if compress:
+            data = compress_bytes(data, "zlib" if compress is True else compress)
+        return self.encrypt_blocks(pkcs7_padding(data)) # Adds padding
+
+    def decrypt(self, text: bytes, cbc=False, iv=None, compress=False) -> str:
+        """Same as AES.decrypt, both ECB and CBC decryption run in parallel."""
+        if len(text) < self.min_size:
+            return self.aes.decrypt(text, cbc, iv, compress)
+        assert len(text) % 16 == 0, "Invalid ciphertext length. ECB and CBC ciphertext is a multiple of 16 bytes."
+        if cbc:
+            iv = self.aes.default_iv if iv is None else (iv.encode("utf-8") if isinstance(iv, str) else bytes(iv))
+            decrypted_text = self.run("cbc_decrypt", text, iv)
+        else:
+            decrypted_text = self.decrypt_blocks(text)
+        decrypted_text = pkcs7_padding_undo(decrypted_text) # Undo any added padding
+        return (decompress_bytes(decrypted_text) if compress else decrypted_text).decode("utf-8")
+
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Encrypt concatenated 16 byte blocks (ECB)."""
+        return self.run("encrypt_blocks", data) if len(data) >= self.min_size else self.aes.encrypt_blocks(data)
+
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Decrypt concatenated 16 byte blocks (ECB)."""
+        return self.run("decrypt_blocks", data) if len(data) >= self.min_size else self.aes.decrypt_blocks(data)
+
+    def encrypt_ctr(self, data: bytes, nonce, offset=0) -> bytes:
+        """Same as AES.encrypt_ctr, every chunk starts at its own counter."""
+        if len(data) < self.min_size:
+            return self.aes.encrypt_ctr(data, nonce, offset)
+        nonce = nonce.encode("utf-8") if isinstance(nonce, str) else bytes(nonce)
+        return self.run("ctr", data, (nonce, offset))
+
+    def decrypt_ctr(self, data: bytes, nonce, offset=0) -> bytes:
+        """Same as AES.decrypt_ctr (the same keystream XOR as encryption)."""
+        return self.encrypt_ctr(data, nonce, offset)
@@ -0,0 +1,133 @@
+import argparse, functools, importlib, random, time
+from aes.src.aes import AES
+
+## PROFILER ##
+# (module, class or None, attribute) for every stage that is timed, nothing is wrapped until a Profiler starts
+STAGES = [
+    ("aes.src.aes", "AES", "encrypt"), ("aes.src.aes", "AES", "decrypt"),
+    ("aes.src.aes", "AES", "key_schedule"), ("aes.src.aes", "AES", "rot_bytes"),
+    ("aes.src.aes", "AES", "encrypt_block"), ("aes.src.aes", "AES", "decrypt_block"),
+    ("aes.src.aes", "AES", "encrypt_blocks"), ("aes.src.aes", "AES", "decrypt_blocks"),
+    ("aes.src.aes", "AES", "sub_bytes"), ("aes.src.aes", "AES", "shift_rows"),
+    ("aes.src.aes", "AES", "mix_columns"), ("aes.src.aes", "AES", "add_round"),
+    ("aes.src.aes", None, "to_matrix"), ("aes.src.aes", None, "to_bytes"), ("aes.src.aes", None, "xor"),
+    ("aes.src.modes.stream", "Encryptor", "update"), ("aes.src.modes.stream", "Encryptor", "finalize"),
+    ("aes.src.modes.stream", "Decryptor", "update"), ("aes.src.modes.stream", "Decryptor", "finalize"),
+    ("aes.src.modes.stream", None, "xor_bytes"), ("aes.src.modes.stream", None, "ctr"),
+    ("aes.src.modes.ctr", None, "keystream"), ("aes.src.modes.ctr", None, "xor_bytes"),
+    ("aes.src.modes.gcm", None, "ctr"), ("aes.src.modes.gcm", None, "ghash"),
+]
+
+class Profiler:
+    """Times every stage while active (with Profiler() as profiler: ...). Single threaded, wrappers are removed on exit."""
+    def __init__(self) -> None:
+        self.stats = {} # stage -> [calls, total ns, self ns]
+        self.stacks = {} # call stack (tuple of stages) -> self ns, for collapsed stack output
+        self.stack = [] # [stage, ns spent in children] for each active call
+        self.patched = [] # (owner, attribute, original) to restore
+
+    def wrap(self, stage: str, func):
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = profiler.stack
+            frame = [stage, 0]
+            stack.append(frame)
+            start_time = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                execution_time = time.perf_counter_ns() - start_time
+                path = tuple(name for name, _ in stack)
+                stack.pop()
+                if stack:
+                    stack[-1][1] += execution_time # parent's self time excludes this call
+                stats = profiler.stats.setdefault(stage, [0, 0, 0])
+                stats[0] += 1
+                stats[1] += execution_time
+                stats[2] += execution_time - frame[1]
+                profiler.stacks[path] = profiler.stacks.get(path, 0) + execution_time - frame[1]
+        return wrapper
+
+    def start(self) -> None:
+        for module_name, class_name, attribute in STAGES:
+            module = importlib.import_module(module_name) # not attribute access, aes.src.modes.ctr is shadowed by the ctr function
+            owner = getattr(module, class_name) if class_name else module
+            original = owner.__dict__[attribute] if class_name else getattr(module, attribute)
+            self.patched.append((owner, attribute, original))
+            stage = f"{class_name}.{attribute}" if class_name not in (None, "AES") else attribute
+            setattr(owner, attribute, self.wrap(stage, original))
+
+    def stop(self) -> None:
+        while self.patched:
+            owner, attribute, original = self.patched.pop()
+            setattr(owner, attribute, original)
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def report(self) -> str:
+        """Calls, cumulative and self time per stage, most expensive (self time) first."""
+        total = sum(stats[2] for stats in self.stats.values()) or 1
+        lines = [f"{'stage':<20}{'calls':>12}{'total ms':>12}{'self ms':>12}{'self %':>9}"]
+        for stage, (calls, cumulative, own) in sorted(self.stats.items(), key=lambda item: -item[1][2]):
+            lines.append(f"{stage:<20}{calls:>12,}{cumulative / 1e6:>12.2f}{own / 1e6:>12.2f}{100 * own / total:>8.1f}%")
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        """Collapsed stacks ("encrypt;Encryptor.update;encrypt_block;sub_bytes 1234", self microseconds) for flamegraph tools."""
+        return "\n".join(f"{';'.join(path)} {own // 1000}" for path, own in sorted(self.stacks.items()) if own >= 1000) + "\n"
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w") as FILE:
+            FILE.write(self.collapsed())
+
+## CLI ##
+def workload(args):
+    """Builds the input, then returns a function running the chosen operation once."""
+    data_source = random.Random(args.seed)
+    key = data_source.randbytes(args.key_size)
+    text = data_source.randbytes(args.size)
+    iv = {"ecb": None, "cbc": data_source.randbytes(16), "ctr": data_source.randbytes(8), "gcm": data_source.randbytes(12)}[args.mode]
+
+    aes = AES(key, args.engine, cache=False)
+    run = lambda stream, data: stream.update(data) + stream.finalize()
+    if args.operation == "encrypt":
+        return lambda: run(aes.encryptor(args.mode, iv), text)
+    encrypted_text = run(aes.encryptor(args.mode, iv), text)
+    return lambda: run(aes.decryptor(args.mode, iv), encrypted_text)
+
+def main(args) -> None:
+    operation = workload(args)
+    with Profiler() as profiler:
+        for _ in range(args.repeat):
+            operation()
+
+    print(f"{args.operation} {args.size:,} bytes ({args.mode}, {8 * args.key_size}-bit key, {args.engine} engine) x{args.repeat}\n")
+    print(profiler.report())
+    if args.collapsed:
+        profiler.write_collapsed(args.collapsed)
+        print(f"\nCollapsed stacks written to \"{args.collapsed}\"")
+
+if __name__ == "__main__":
+    """Run the file by copying into your terminal: python3 -m aes.src.profiler --mode cbc --size 65536 --collapsed aes.folded"""
+    # create the parser
+    parser = argparse.ArgumentParser(description='Profile where time goes across the AES round stages for one workload.')
+    # add arguments
+    parser.add_argument("--operation", choices=["encrypt", "decrypt"], default="encrypt", help="operation to profile")
+    parser.add_argument("--mode", choices=["ecb", "cbc", "ctr", "gcm"], default="ecb", help="mode of operation")
+    parser.add_argument("--engine", default="standard", help="block engine (the round stages only run in the standard engine)")
+    parser.add_argument("--key-size", type=int, choices=[16, 24, 32], default=16, help="key length in bytes")
+    parser.add_argument("--size", type=int, default=16384, help="input size in bytes")
+    parser.add_argument("--repeat", type=int, default=1, help="times to run the workload")
+    parser.add_argument("--seed", type=int, default=197, help="seed for the generated key and input")
+    parser.add_argument("--collapsed", help="write collapsed stacks (flamegraph.pl, speedscope) to this path")
+    # parse the arguments
+    args = parser.parse_args()
+
+    main(args)
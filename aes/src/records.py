@@ -0,0 +1,194 @@
+import os, struct, warnings
+
+## RECORD LOG ##
+# header | record | record | ... | end    record = length (4 bytes) | iv | ciphertext (+ 16 byte tag in gcm)
+# every record is encrypted on its own with a random iv, so appending never touches earlier records,
+# gcm records authenticate the header (random log id) and their own offset, so they cannot be moved between logs or reordered,
+# gcm logs finish with a sealed end (where the records stop and how many there are) that every append overwrites,
+# so records cut off the end, or removed anywhere, fail the check when the log is opened
+MAGIC = b"AESL"
+VERSION = 3
+MODES = {"gcm": 0, "cbc": 1}
+HEADER = struct.Struct(">4sBBH16s") # magic, version, mode, key bits, random log id
+OFFSET = struct.Struct(">Q") # record offset, part of its associated data
+LENGTH = struct.Struct(">I") # ciphertext length of one record
+END = struct.Struct(">QI") # offset where the records stop, record count (gcm only)
+END_SIZE = 12 + END.size + 16 # nonce, sealed END and tag
+IV_LENGTH = {"gcm": 12, "cbc": 16}
+
+def read_header(file, aes) -> tuple:
+    """Check the header against the key and return (header bytes, mode)."""
+    header = file.read(HEADER.size)
+    magic, version, mode, key_bits, _ = HEADER.unpack(header)
+    assert magic == MAGIC, "Not an AES record log."
+    assert version == VERSION, f"Unsupported record log version {version}."
+    assert key_bits == 8 * len(aes.key), f"Record log was written with a {key_bits}-bit key."
+    return header, {number: name for name, number in MODES.items()}[mode]
+
+def end_data(header: bytes, end: int) -> bytes:
+    """Associated data of the sealed end, never the same as a record's."""
+    return header + OFFSET.pack(end) + b"end"
+
+def seal_end(aes, header: bytes, end: int, count: int) -> bytes:
+    nonce = os.urandom(12)
+    return nonce + aes.encrypt_gcm(END.pack(end, count), nonce, end_data(header, end))
+
+def read_end(file, aes, header: bytes, size: int) -> tuple:
+    """(end, count) from the sealed end of a gcm log, raises ValueError if it is missing or modified."""
+    end = size - END_SIZE
+    if end < HEADER.size:
+        raise ValueError("Record log has no sealed end, it was cut short.")
+    file.seek(end)
+    sealed = file.read(END_SIZE)
+    try:
+        sealed_end, count = END.unpack(aes.decrypt_gcm(sealed[12:], sealed[:12], end_data(header, end)))
+    except ValueError:
+        raise ValueError("Record log does not finish with its sealed end, it was cut short or an append was interrupted.") from None
+    return sealed_end, count
+
+class RecordWriter:
+    """Appends records to a log, creating it (with the given mode) when it does not exist. append() is O(record).
+    recover opens a log that does not finish properly (a crash during append, or records cut off the end):
+    it keeps every complete record, moves the bytes after them to path + ".torn" and warns, otherwise ValueError is raised."""
+    def __init__(self, path: str, aes, mode="gcm", recover=True) -> None:
+        assert mode in MODES, f"Invalid mode. Record logs allow {', '.join(MODES)} modes."
+        self.aes = aes
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            self.file = open(path, "r+b")
+            self.header, self.mode = read_header(self.file, aes) # existing logs keep their mode
+            if self.mode == "cbc": # no sealed end, a torn record is found by walking the lengths
+                self.end, self.count = os.path.getsize(path), None
+                if recover:
+                    self.recover(path)
+            else:
+                try:
+                    self.end, self.count = read_end(self.file, aes, self.header, os.path.getsize(path))
+                except ValueError:
+                    if not recover:
+                        raise
+                    self.recover(path)
+        else:
+            self.file = open(path, "w+b")
+            self.mode = mode
+            self.header = HEADER.pack(MAGIC, VERSION, MODES[mode], 8 * len(aes.key), os.urandom(16))
+            self.end, self.count = HEADER.size, 0
+            self.file.write(self.header + self.sealed_end())
+
+    def sealed_end(self) -> bytes:
+        return seal_end(self.aes, self.header, self.end, self.count) if self.mode == "gcm" else b""
+
+    def recover(self, path: str) -> None:
+        """Keep the complete records of a log that does not finish properly, found from the lengths alone (nothing is decrypted).
+        The loss is reported and the bytes after the last complete record are kept in path + ".torn", never just deleted."""
+        with RecordReader(path, self.aes, check_end=False) as reader:
+            self.count = sum(1 for _ in reader.offsets())
+            self.end = reader.end
+        lost = os.path.getsize(path) - self.end
+        if lost:
+            self.file.seek(self.end)
+            with open(path + ".torn", "wb") as FILE:
+                FILE.write(self.file.read())
+        if lost or self.mode == "gcm":
+            moved = f", {lost} bytes after offset {self.end} were moved to {path}.torn" if lost else ""
+            warnings.warn(f"Record log {path} was cut short or an append was interrupted. Kept {self.count} records{moved}.", RuntimeWarning, stacklevel=3)
+        self.file.truncate(self.end)
+        self.file.seek(self.end)
+        self.file.write(self.sealed_end())
+
+    def append(self, data) -> int:
+        """Encrypt data as one record at the end of the log. Returns the record's offset for RecordReader.read()."""
+        data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        offset = self.end
+        iv = os.urandom(IV_LENGTH[self.mode])
+        if self.mode == "gcm":
+            encrypted = self.aes.encrypt_gcm(data, iv, self.header + OFFSET.pack(offset))
+        else:
+            encryptor = self.aes.encryptor("cbc", iv)
+            encrypted = encryptor.update(data) + encryptor.finalize()
+
+        record = LENGTH.pack(len(encrypted)) + iv + encrypted
+        self.end += len(record)
+        if self.count is not None:
+            self.count += 1
+        self.file.seek(offset)
+        self.file.write(record + self.sealed_end()) # one write per record, over the previous end
+        return offset
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+class RecordReader:
+    """Reads a log lazily, records are only decrypted when they are yielded.
+    A gcm log's sealed end is checked when it opens, and walking every record checks it was not removed (ValueError)."""
+    def __init__(self, path: str, aes, check_end=True) -> None:
+        self.aes = aes
+        self.file = open(path, "rb")
+        self.header, self.mode = read_header(self.file, aes)
+        self.size = os.path.getsize(path) # where the records stop
+        self.count = None # records in a gcm log
+        if self.mode == "gcm" and check_end:
+            self.size, self.count = read_end(self.file, aes, self.header, self.size)
+        self.end = HEADER.size # offset just past the last complete record seen by offsets()
+
+    def offsets(self, offset=None):
+        """Offset of every record from offset (default the first), found from the lengths alone (nothing is decrypted).
+        A record cut short by a crash during append ends the log, unless the sealed end says it holds more."""
+        check = self.count is not None and offset is None
+        offset = HEADER.size if offset is None else offset
+        prefix = LENGTH.size + IV_LENGTH[self.mode]
+        count = 0
+        while True:
+            self.file.seek(offset)
+            length = self.file.read(LENGTH.size) if offset + LENGTH.size <= self.size else b""
+            end = offset + prefix + LENGTH.unpack(length)[0] if length else None
+            if end is None or end > self.size:
+                if check and (offset != self.size or count != self.count):
+                    raise ValueError(f"Record log lengths do not match its sealed end ({count} of {self.count} records found before offset {offset}).")
+                return
+            self.end = end
+            count += 1
+            yield offset
+            offset = end
+
+    def read(self, offset: int) -> bytes:
+        """Decrypt the record at offset (gcm raises ValueError if it was modified)."""
+        self.file.seek(offset)
+        length = LENGTH.unpack(self.file.read(LENGTH.size))[0]
+        iv = self.file.read(IV_LENGTH[self.mode])
+        encrypted = self.file.read(length)
+        if self.mode == "gcm":
+            return self.aes.decrypt_gcm(encrypted, iv, self.header + OFFSET.pack(offset))
+        decryptor = self.aes.decryptor("cbc", iv)
+        return decryptor.update(encrypted) + decryptor.finalize()
+
+    def records(self, skip=0, offset=None):
+        """Yield decrypted records, skipping the first skip records (or starting at a saved offset) without decrypting them."""
+        for index, record_offset in enumerate(self.offsets(offset)):
+            if index >= skip:
+                yield self.read(record_offset)
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "RecordReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+def open_log(path: str, aes, mode="r", cipher_mode="gcm"):
+    """open() for record logs, "r" returns a RecordReader and "a" a RecordWriter."""
+    assert mode in ("r", "a"), "Record logs open with \"r\" or \"a\"."
+    return RecordReader(path, aes) if mode == "r" else RecordWriter(path, aes, cipher_mode)
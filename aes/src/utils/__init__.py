@@ -1,2 +1,2 @@
 from aes.src.utils.rijndael import RCON, SBOX, SBOX_INV
-from aes.src.utils.utils import to_matrix, to_bytes, pkcs7_padding, pkcs7_padding_undo, galois, xor, load_chunks, record_time
\ No newline at end of file
+from aes.src.utils.utils import to_matrix, to_bytes, pkcs7_padding, pkcs7_padding_undo, padded_size, galois, xor, xor_bytes, load_chunks
\ No newline at end of file
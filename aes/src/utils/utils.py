@@ -1,5 +1,3 @@
-import time
-
 ## UTILS ##
 def to_matrix(block: list) -> list:
     """Convert a 16-byte block to a 4x4 matrix."""
@@ -11,13 +9,20 @@ def to_bytes(block: list) -> bytes:
 
 def pkcs7_padding(data: bytes) -> bytes:
     """Apply PKCS#7 padding to the data to make it a multiple of 16."""
-    padding_length = (16 - len(data)) % 16 # adds padding up to a len of 16
+    padding_length = 16 - len(data) % 16 # always 1 to 16 bytes so binary data ending in small values survives
     padding = bytes([padding_length] * padding_length)
     return data + padding
 
 def pkcs7_padding_undo(data: bytes):
     """Removes application of PKCS#7 padding."""
-    return data[:-data[-1]] if data[-1] in range(1, 16) else data 
+    padding_length = data[-1] if data else 0
+    if padding_length in range(1, 17) and data[-padding_length:] == bytes([padding_length] * padding_length):
+        return data[:-padding_length]
+    return data # no valid padding (older files did not pad text that was already a multiple of 16)
+
+def padded_size(length: int) -> int:
+    """Size of data after PKCS#7 padding, used to allocate output buffers up front."""
+    return length + 16 - length % 16
 
 def galois(a, b):
     """Implementation of Galois field."""
@@ -35,19 +40,13 @@ def galois(a, b):
 def xor(a, b) -> bytes:
     return bytes(i ^ j for i, j in zip(a, b))
 
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    """XOR two equal length byte strings in one pass using integers."""
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
+
 def load_chunks(input) -> list:
     """Creates blocks of data in chunks of 16 characters of bytes."""
     chunks = []
     for index in range(0, len(input), 16):
         chunks.append(input[index: index + 16])
-    return chunks
-
-def record_time(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"* {func.__name__}:\t{execution_time:.6f} seconds")
-        return result
-    return wrapper
\ No newline at end of file
+    return chunks
\ No newline at end of file
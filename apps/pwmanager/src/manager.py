@@ -1,76 +1,68 @@
 
-import json, os, string, random
+import json, os
 import sys
 sys.path.append('../applications-of-aes') # path to aes
 
 # local packages
 from aes import AES
-from apps.utils import load_encryption_settings
+from apps.pwmanager.src.vault import Vault
+from apps.utils import load_encryption_settings, start_metrics
 
 class Manager:
-    def __init__(self, manager_path: str, encrypted_path: str) -> None:
-        self.manager_path = manager_path # manager json path
-        self.encrypted_path = encrypted_path # encrypted password path 
+    def __init__(self, vault_path: str, manager_path=None) -> None:
+        self.vault_path = vault_path # single encrypted vault file
+        self.manager_path = manager_path # old manager json path, it and the .bin files it lists are migrated once
 
         self.key, self.cbc, self.iv = load_encryption_settings() # load encryption settings
         self.aes = AES(self.key) # aes object
+        self.vault_aes = AES(self.key, "table") # every vault record is small, tables are fastest for one block at a time
+        self.vault = Vault(vault_path, self.vault_aes)
+
+        if manager_path is not None and os.path.isfile(manager_path):
+            self.migrate()
+
+    def migrate(self) -> None:
+        """Moves the old layout (manage.json and one .bin per password) into a new vault, then deletes it.
+        The vault is built next to the real one and swapped in, so an interrupted migration simply runs again."""
+        if self.vault.live or self.vault.dead:
+            print(f"{self.manager_path} was not migrated, {self.vault_path} already has data.")
+            return
+
+        data = json.load(open(self.manager_path))["manage"]
+        paths = []
+        temporary = self.vault_path + ".migrate"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        with Vault(temporary, self.vault_aes) as vault:
+            for location, information in data.items():
+                for info in information:
+                    for username, path in info.items():
+                        if not os.path.isfile(path):
+                            print(f"{path} is missing, {username} at {location} was not migrated.")
+                            continue
+                        with open(path, "rb") as FILE:
+                            vault.add(location, username, self.decrypt_data(FILE.read())) # decrypts password
+                        paths.append(path)
+            os.fsync(vault.writer.file.fileno()) # the vault is on disk before the old files go
 
-    def load_manage_data(self) -> dict:
-        """Loads the json data to instance of class."""
-        return json.load(open(self.manager_path))
-    
-    def save_data(self, data: dict()) -> None:
-        """Saves the json data to manager.json"""
-        json_object = json.dumps({"manage": data}, indent=4)
+        self.vault.close()
+        os.replace(temporary, self.vault_path)
+        self.vault = Vault(self.vault_path, self.vault_aes)
 
-        with open(self.manager_path, "w") as FILE:
-            FILE.write(json_object)
+        for path in paths:
+            os.remove(path)
+        os.remove(self.manager_path)
+        print(f"Migrated {len(paths)} passwords into {self.vault_path}")
 
     def add_data(self, location: str, username: str, password: str) -> None:
-        """Creates the encrypted data and stores it in the manager."""
-        encrypted_password = self.encrypt_data(password) # encrypted password data
-        
-        # writes encrypted data to the path 
-        random_fname = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(10))  # random name to encrypt location
-        encrypted_path = self.encrypted_path + f"/{random_fname}.bin" # encrypted file path 
-        
-        # creates and writes to the file with the encrypted password
-        with open(encrypted_path, "wb") as FILE:
-            FILE.write(encrypted_password)
-
-        # adds new data to the manager json
-        updated_data = self.load_manage_data()["manage"] # grabs data
-        data_scheme = {username: encrypted_path}
-
-        if location in updated_data.keys():
-            updated_data[location].append(data_scheme) # if the location has multiple logins 
-        else:
-            updated_data[location] = [data_scheme] # new location 
-
-        self.save_data(updated_data) # save
+        """Stores the encrypted data in the vault."""
+        self.vault.add(location, username, password) # one record appended, nothing rewritten
 
     def remove_data(self, location: str) -> None:
-        """Deletes the file and removes from manager."""
-        data = self.load_manage_data()["manage"] # grabs data 
-
-        if location not in data.keys():
+        """Removes a location from the vault."""
+        if not self.vault.remove(location):
             print("Location does not exist...") # location to remove does not exist
-        else: # removes the files assocated with the location
-            location_path = data[location]
-            for info in location_path:
-                for remove_location in info.values():
-                    os.remove(remove_location)
-            
-            del data[location] # removes from location from manager json
-
-            self.save_data(data) # save data
 
-    def encrypt_data(self, data: str) -> bytes:
-        """This takes a string and encrypts it based on blocks."""
-        encrypted_data = self.aes.encrypt(data, self.cbc, self.iv)
-
-        return encrypted_data # returns the encrypted byte variable
-    
     def decrypt_data(self, data: bytes) -> str:
         """This takes a string and decrypts it based on blocks."""
         # NOTE: This method only works with single line bin files which is applicable...for file conversion a while loop must be used
@@ -79,8 +71,8 @@ class Manager:
         return decrypted_data # returns the decrypted string variable
     
     def display_locations(self) -> None:
-        """Gets list of locations from manage.json"""
-        data = list(self.load_manage_data()["manage"]) # gets a list of the locations
+        """Gets list of locations from the vault."""
+        data = self.vault.locations() # gets a list of the locations
 
         if len(data) == 0:
             print(None) # prints none if manager is empty
@@ -89,28 +81,22 @@ class Manager:
 
     def display_data(self, detailed: bool) -> None:
         """Displays data from manager based."""
-        data = self.load_manage_data()["manage"] # grabs manager json data 
-
         if not detailed: # simple format
             self.display_locations()
         else: # detailed format
-            for location, information in data.items(): # location and info assocated with location
-                # get the encrypted data
+            for location in self.vault.locations(): # location and info assocated with location
                 print(f"\t__{location}__") 
-                for index, info in enumerate(information): # each profile in location
-                    for username, path in info.items(): # username and path holding the encrypted password
-                        with open(path, "rb") as FILE:
-                            password = self.decrypt_data(FILE.read()) # decrypts password                      
-
-                        print(f"\tUsername ({index + 1}): {username}\n\tPassword ({index + 1}): {password}")
+                for index, (username, password) in enumerate(self.vault.logins(location)): # each profile in location, decrypted from the vault
+                    print(f"\tUsername ({index + 1}): {username}\n\tPassword ({index + 1}): {password}")
 
 
 def main() -> None:
+    start_metrics() # optional metrics (AES_METRICS, AES_METRICS_PORT, AES_METRICS_FILE)
     # config
-    manager_path = "apps/pwmanager/data/manage.json" # path to json manager
-    encrypted_path = "apps/pwmanager/data/encrypted" # path to encrypted password folder
+    vault_path = "apps/pwmanager/data/vault.bin" # path to the vault
+    manager_path = "apps/pwmanager/data/manage.json" # old json manager, migrated into the vault on first run
 
-    manager = Manager(manager_path, encrypted_path) # manager object
+    manager = Manager(vault_path, manager_path) # manager object
     commands = "\n# 0: add data, 1: remove data, 2: view data, 3: exit" # string of commands for user
 
     print("### PASSWORD MANAGER ###")
@@ -140,6 +126,7 @@ def main() -> None:
                 manager.display_data(config == "D")
             # exits the user from the programs
             elif user_input == 3:
+                manager.vault.close()
                 print("\n# Goodbye! #")
                 break
             # invalid input
@@ -0,0 +1,105 @@
+import json, os
+import sys
+sys.path.append('../applications-of-aes') # path to aes
+
+# local packages
+from aes.src.records import RecordReader, RecordWriter
+
+## VAULT ##
+# every change is one encrypted record appended to a single log: {"op": "add", location, username, password} or {"op": "remove", location},
+# the index (location -> [(username, record offset)]) is rebuilt from the log when it opens, passwords are only decrypted when read
+COMPACT_MIN = 64 # dead records before compaction is considered, it runs once they outnumber the live ones
+
+class Vault:
+    """All passwords in one append-only record log. Adding, removing and finding a location are O(1)."""
+    def __init__(self, path: str, aes, compact_min=COMPACT_MIN) -> None:
+        self.path = path
+        self.aes = aes
+        self.compact_min = compact_min
+        self.open()
+
+    def open(self) -> None:
+        """Opens the log (creating it, and cutting off a record torn by a crash) and rebuilds the index."""
+        self.writer = RecordWriter(self.path, self.aes, "gcm")
+        self.writer.flush()
+        self.reader = RecordReader(self.path, self.aes)
+
+        self.index = {} # location -> [(username, offset)]
+        self.live = 0 # records the index points to
+        self.dead = 0 # removed entries, their remove records and damaged records, reclaimed by compact()
+        self.damaged = 0
+        try:
+            for offset in self.reader.offsets():
+                try:
+                    self.apply(json.loads(self.reader.read(offset)), offset)
+                except (ValueError, KeyError): # modified or unreadable, the other records are still good
+                    print(f"Skipped a damaged record at offset {offset} of {self.path}.")
+                    self.damaged += 1
+                    self.dead += 1
+        except ValueError as e: # the record lengths no longer add up, nothing after this point can be found
+            print(f"{e} Only the records before it were loaded from {self.path}.")
+
+    def apply(self, record: dict, offset: int) -> None:
+        if record["op"] == "add":
+            login = (record["username"], offset)
+            self.index.setdefault(record["location"], []).append(login)
+            self.live += 1
+        else:
+            removed = len(self.index.pop(record["location"], []))
+            self.live -= removed
+            self.dead += removed + 1
+
+    def append(self, record: dict) -> None:
+        offset = self.writer.append(json.dumps(record))
+        self.writer.flush() # readers see it right away
+        os.fsync(self.writer.file.fileno()) # and it survives a power loss, one fsync per change a person makes
+        self.apply(record, offset)
+
+    def add(self, location: str, username: str, password: str) -> None:
+        self.append({"op": "add", "location": location, "username": username, "password": password})
+
+    def remove(self, location: str) -> bool:
+        """Removes every login of a location, False when it does not exist."""
+        if location not in self.index:
+            return False
+        self.append({"op": "remove", "location": location})
+        if self.dead >= self.compact_min and self.dead > self.live:
+            self.compact()
+        return True
+
+    def locations(self) -> list:
+        return list(self.index)
+
+    def logins(self, location: str) -> list:
+        """(username, password) for every login of a location, one read per login from the open log."""
+        return [(username, json.loads(self.reader.read(offset))["password"]) for username, offset in self.index.get(location, [])]
+
+    def compact(self) -> None:
+        """Rewrites the log with only the live records, then swaps it in.
+        Records are bound to their log and offset, so each one is decrypted and encrypted again."""
+        temporary = self.path + ".compact"
+        if os.path.exists(temporary):
+            os.remove(temporary) # left by an interrupted compaction, the log itself is still complete
+        with RecordWriter(temporary, self.aes, self.writer.mode, recover=False) as writer:
+            for entries in self.index.values():
+                for _, offset in entries:
+                    writer.append(self.reader.read(offset))
+            writer.flush()
+            os.fsync(writer.file.fileno())
+
+        self.close()
+        os.replace(temporary, self.path) # atomic, a crash leaves either the old or the new log
+        self.open()
+
+    def stats(self) -> dict:
+        return {"locations": len(self.index), "live": self.live, "dead": self.dead, "damaged": self.damaged, "bytes": os.path.getsize(self.path)}
+
+    def close(self) -> None:
+        self.writer.close()
+        self.reader.close()
+
+    def __enter__(self) -> "Vault":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,22 +1,30 @@
 
-import socket, threading, json
+import asyncio, argparse, os, socket, threading, json
 import sys
 sys.path.append('../applications-of-aes') # path to aes
 
 # local packages
 from aes import AES
-from apps.utils import load_encryption_settings
+from apps.sockets.src.protocol import NAME, NOTICE, MESSAGE, BULK, FrameReader, FrameWriter, encode_frame, read_frame
+from apps.sockets.src.transfer import Receiver, Sender, pipeline, transfer_engine
+from apps.utils import load_encryption_settings, start_metrics
 
 class Client:
-    def __init__(self, host: str, port: int, user_name: str) -> None:
+    def __init__(self, host: str, port: int, user_name: str, compress=False, download_dir="downloads") -> None:
         self.host = host
         self.port = port
         self.user_name = user_name
+        self.compress = compress # every client must use the same setting (apps/sockets/config.json)
 
         self.key, self.cbc, self.iv = load_encryption_settings() # load encryption settings
         self.aes = AES(self.key) # aes object
+        self.file_aes = transfer_engine(self.key) # file transfers encrypt whole chunks
+        self.transfers = Receiver(self.file_aes, download_dir)
 
         self.client_socket = socket.socket()
+        self.frames = FrameReader() # received bytes may hold part of a frame or several frames
+        self.writer = FrameWriter(self.client_socket.sendall)
+        self.send_lock = threading.Lock() # chat input and file transfers share the socket
 
     def run(self) -> None:
         """This starts the thread for the client."""
@@ -32,12 +40,33 @@ class Client:
     def connect(self) -> None:
         """This connects the client to the server."""
         self.client_socket.connect((self.host, self.port))
-        self.client_socket.send(self.user_name.encode())
+        self.send_frame(encode_frame(NAME, self.user_name.encode()))
 
-        connected_message = self.client_socket.recv(4096).decode()
+        self.received = [] # frames that arrived together with the connected message
+        while not self.received:
+            self.received = self.frames.feed(self.client_socket.recv(4096))
+        connected_message = self.received.pop(0)[1].decode()
 
         print(f"=====\nConnected to server!\nHost: {self.host}\nPort: {self.port}\nStrength: {len(self.aes.key)}\n{connected_message}\n=====\n")
 
+    def encrypt_message(self, data_input: str) -> bytes:
+        data = f"[{self.user_name}] {data_input}" # adds username to encryption
+        return self.aes.encrypt(data, self.cbc, self.iv, self.compress) # encrypts the data to send
+
+    def send_frame(self, frame: bytes) -> None:
+        """Send one whole frame, a file chunk and a chat message never interleave."""
+        with self.send_lock:
+            self.writer.send_frame(frame)
+            self.writer.flush()
+
+    def send_file(self, path: str) -> None:
+        """Sends a file in encrypted chunks, the next chunk is encrypted while the current one is sent."""
+        sender = Sender(self.file_aes, path, self.user_name)
+        for frame, size in pipeline(sender.frames()):
+            self.send_frame(frame)
+            sender.progress.update(size)
+        print(f"[Transfer] Sent. {sender.progress.summary()}")
+
     def send_messages(self) -> None:
         """Sends and encrypts messages to server."""
         while True:
@@ -46,37 +75,128 @@ class Client:
             # checks to see if user wants to disconnect
             if data_input == "exit":
                 break
-            data = f"[{self.user_name}] {data_input}" # adds username to encryption
-
-            # encrypts the data to send
-            byte_data = self.aes.encrypt(data, self.cbc, self.iv)
 
-            self.client_socket.send(byte_data)
+            # "/send <path>" transfers a file while chat continues
+            if data_input.startswith("/send "):
+                path = data_input[6:].strip()
+                if os.path.isfile(path):
+                    threading.Thread(target=self.send_file, args=(path,), daemon=True).start()
+                else:
+                    print(f"[Transfer] No file at {path}")
+                continue
+
+            self.send_frame(encode_frame(MESSAGE, self.encrypt_message(data_input)))
+
+    def show(self, frame_type: int, payload: bytes) -> None:
+        """Print one received frame, notices are plain text and messages are decrypted."""
+        if frame_type == NOTICE:
+            print(f"[Server] {payload.decode()}")
+        elif frame_type == MESSAGE:
+            print(self.aes.decrypt(payload, self.cbc, self.iv, self.compress)) # decrypts the data from the user
+        elif frame_type in BULK:
+            self.transfers.handle(frame_type, payload) # written to the download directory as it arrives
 
     def receive_messages(self) -> None:
         """Receive and display messages from the server."""
+        for frame in self.received:
+            self.show(*frame)
         while True:
             # recieve
-            data = self.client_socket.recv(4096)
-            
+            data = self.client_socket.recv(65536)
+
             # checks to see if data is empty
             if not data:
+                self.transfers.close()
+                break
+
+            for frame in self.frames.feed(data): # only whole frames, however TCP split or merged them
+                self.show(*frame)
+
+class AsyncClient(Client):
+    """Same client on asyncio streams, receiving runs on the event loop and input() on a worker thread."""
+    def run(self) -> None:
+        asyncio.run(self.run_async())
+
+    async def run_async(self) -> None:
+        await self.connect()
+
+        receive_task = asyncio.create_task(self.receive_messages()) # client listens for messages
+        await self.send_messages()
+
+        receive_task.cancel()
+        self.stream_writer.close()
+
+    async def connect(self) -> None:
+        """This connects the client to the server."""
+        self.stream_reader, self.stream_writer = await asyncio.open_connection(self.host, self.port)
+        self.stream_writer.write(encode_frame(NAME, self.user_name.encode()))
+
+        connected_message = (await read_frame(self.stream_reader))[1].decode()
+
+        print(f"=====\nConnected to server!\nHost: {self.host}\nPort: {self.port}\nStrength: {len(self.aes.key)}\n{connected_message}\n=====\n")
+
+    async def send_file(self, path: str) -> None:
+        """Sends a file in encrypted chunks, the next chunk is encrypted on a worker thread while the current one is sent."""
+        loop = asyncio.get_running_loop()
+        sender = Sender(self.file_aes, path, self.user_name)
+        frames = sender.frames()
+        pending = loop.run_in_executor(None, next, frames, None)
+        while True:
+            item = await pending
+            if item is None:
                 break
+            pending = loop.run_in_executor(None, next, frames, None)
+            self.stream_writer.write(item[0]) # one write per frame, chat frames go in between
+            await self.stream_writer.drain()
+            sender.progress.update(item[1])
+        print(f"[Transfer] Sent. {sender.progress.summary()}")
 
-            # check to see if its a join message
-            if b"[Server]" in data:
-                print(data.decode())
-            else:
-                # decrypts the data from the user
-                text_data = self.aes.decrypt(data, self.cbc, self.iv)
+    async def send_messages(self) -> None:
+        """Sends and encrypts messages to server."""
+        loop = asyncio.get_running_loop()
+        transfers = set() # keeps running transfer tasks referenced
+        while True:
+            data_input = await loop.run_in_executor(None, input) # client input, without blocking the loop
 
-                print(text_data)
+            # checks to see if user wants to disconnect
+            if data_input == "exit":
+                break
+
+            # "/send <path>" transfers a file while chat continues
+            if data_input.startswith("/send "):
+                path = data_input[6:].strip()
+                if os.path.isfile(path):
+                    task = asyncio.create_task(self.send_file(path))
+                    transfers.add(task)
+                    task.add_done_callback(transfers.discard)
+                else:
+                    print(f"[Transfer] No file at {path}")
+                continue
+
+            self.stream_writer.write(encode_frame(MESSAGE, self.encrypt_message(data_input)))
+            await self.stream_writer.drain()
+
+    async def receive_messages(self) -> None:
+        """Receive and display messages from the server."""
+        while True:
+            frame = await read_frame(self.stream_reader) # recieve
+
+            # checks to see if the server closed the connection
+            if frame is None:
+                self.transfers.close()
+                break
+            self.show(*frame)
 
 def main():
+    parser = argparse.ArgumentParser(description='Encrypted chat client.')
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run the client on asyncio streams")
+    args = parser.parse_args()
+
+    start_metrics() # optional metrics (AES_METRICS, AES_METRICS_PORT, AES_METRICS_FILE)
     user_name = input("Enter name: ")
     server_data = json.load(open("apps/sockets/config.json")) # opens data from config
     # client object
-    client = Client(server_data["Host"], server_data["Port"], user_name)
+    client = (AsyncClient if args.use_async else Client)(server_data["Host"], server_data["Port"], user_name, server_data.get("Compress", False))
     client.run()
 
 if __name__ == "__main__":
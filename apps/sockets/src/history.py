@@ -0,0 +1,70 @@
+## HISTORY ##
+class History:
+    """Ring buffer of the last encoded MESSAGE frames, bounded by frame count and by bytes.
+    The frames are ciphertext and are stored as received, the server never decrypts them.
+    Memory is allocated once, appending and evicting are O(1) and replay is at most two slices."""
+    def __init__(self, max_frames=256, max_bytes=1 << 20) -> None:
+        assert max_frames > 0 and max_bytes > 0, "History needs room for at least one frame and one byte."
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.buffer = bytearray(max_bytes) # frames back to back, wrapping at the end
+        self.lengths = [0] * max_frames # length of every stored frame, oldest at self.first
+        self.first = 0 # slot of the oldest frame
+        self.count = 0 # frames stored
+        self.start = 0 # buffer offset of the oldest frame
+        self.used = 0 # bytes stored
+
+        # stats
+        self.stored = 0
+        self.evicted = 0
+        self.skipped = 0 # frames larger than the whole buffer
+        self.hits = 0 # joins that got a backlog
+        self.misses = 0 # joins while the history was empty
+        self.replayed_bytes = 0
+
+    def append(self, frame: bytes) -> None:
+        """Store one frame, evicting the oldest ones until it fits."""
+        length = len(frame)
+        if length > self.max_bytes:
+            self.skipped += 1
+            return
+        while self.count and (self.count == self.max_frames or self.used + length > self.max_bytes):
+            self.evict()
+
+        # copy in, split in two when the frame crosses the end of the buffer
+        end = (self.start + self.used) % self.max_bytes
+        head = min(length, self.max_bytes - end)
+        self.buffer[end: end + head] = frame[:head]
+        self.buffer[:length - head] = frame[head:]
+
+        self.lengths[(self.first + self.count) % self.max_frames] = length
+        self.count += 1
+        self.used += length
+        self.stored += 1
+
+    def evict(self) -> None:
+        length = self.lengths[self.first]
+        self.first = (self.first + 1) % self.max_frames
+        self.start = (self.start + length) % self.max_bytes
+        self.count -= 1
+        self.used -= length
+        self.evicted += 1
+
+    def replay(self) -> bytes:
+        """Every stored frame, oldest first, as one block to send with a single write."""
+        if not self.count:
+            self.misses += 1
+            return b""
+        self.hits += 1
+        self.replayed_bytes += self.used
+        end = self.start + self.used
+        if end <= self.max_bytes:
+            return bytes(self.buffer[self.start: end])
+        return bytes(self.buffer[self.start:]) + bytes(self.buffer[:end - self.max_bytes])
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.count, "bytes": self.used, "max_frames": self.max_frames, "max_bytes": self.max_bytes,
+            "stored": self.stored, "evicted": self.evicted, "skipped": self.skipped,
+            "hits": self.hits, "misses": self.misses, "replayed_bytes": self.replayed_bytes,
+        }
@@ -0,0 +1,189 @@
+import argparse, asyncio, json, multiprocessing, os, random, resource, sys, time
+sys.path.append('../applications-of-aes') # path to apps
+
+# local packages
+from aes import AES
+from apps.sockets.src.protocol import NAME, MESSAGE, encode_frame, read_frame
+from apps.sockets.src.server import Server
+from apps.sockets.src.sharded import ShardedServer
+from apps.utils import load_encryption_settings
+
+## LOAD TEST ##
+# every simulated client sends "[name] sequence send_time padding" at a fixed rate and decrypts everything it receives,
+# latency is measured from before encrypt() on the sender to after decrypt() on each receiver (one clock, one process)
+
+def run_server(host: str, port: int, server_data: dict, workers: int) -> None:
+    """Server process with the settings of apps/sockets/config.json, its per message prints would dominate the measurement so they go nowhere."""
+    sys.stdout = open(os.devnull, "w")
+    settings = (server_data.get("QueueSize", 1024), server_data.get("Overflow", "drop_oldest"), server_data.get("HistoryFrames", 256), server_data.get("HistoryBytes", 1 << 20))
+    if workers > 1:
+        ShardedServer(host, port, 1024, workers, *settings).run()
+    else:
+        Server(host, port, 1024, *settings).run()
+
+def percentile(values: list, q: float) -> float:
+    """Nearest rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+class LoadTest:
+    def __init__(self, host: str, port: int, clients: int, rate: float, size: int, duration: float, engine="table", compress=False) -> None:
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.rate = rate # messages per second per client
+        self.size = size # plaintext bytes per message
+        self.duration = duration
+
+        self.key, self.cbc, self.iv = load_encryption_settings() # every client shares the config.json key
+        self.aes = AES(self.key, engine)
+        self.compress = compress
+
+        # results
+        self.sent = 0
+        self.delivered = 0
+        self.latencies = []
+        self.encrypt_seconds = 0.0 # cpu time inside encrypt() / decrypt()
+        self.decrypt_seconds = 0.0
+        self.running = True
+
+    def encrypt_message(self, name: str, sequence: int) -> bytes:
+        start_cpu = time.process_time()
+        data = f"[{name}] {sequence} {time.perf_counter():.9f} "
+        data = data.ljust(self.size, "x")
+        message = self.aes.encrypt(data, self.cbc, self.iv, self.compress)
+        self.encrypt_seconds += time.process_time() - start_cpu
+        return message
+
+    def decrypt_message(self, payload: bytes) -> None:
+        start_cpu = time.process_time()
+        data = self.aes.decrypt(payload, self.cbc, self.iv, self.compress)
+        received = time.perf_counter()
+        self.decrypt_seconds += time.process_time() - start_cpu
+        self.latencies.append(received - float(data.split(" ", 3)[2]))
+        self.delivered += 1
+
+    async def client(self, number: int, joined: list) -> None:
+        """One simulated connection, speaks the same frames as Client."""
+        name = f"user{number}"
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(encode_frame(NAME, name.encode()))
+        await read_frame(reader) # connected list
+        joined.append(name)
+
+        receive_task = asyncio.create_task(self.receive(reader))
+        while len(joined) < self.clients: # nobody sends until everyone is connected
+            await asyncio.sleep(0.01)
+
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate
+        next_send = loop.time() + random.random() * interval # spread the clients over the first interval
+        sequence = 0
+        while self.running:
+            await asyncio.sleep(max(0, next_send - loop.time()))
+            if not self.running:
+                break
+            writer.write(encode_frame(MESSAGE, self.encrypt_message(name, sequence)))
+            await writer.drain()
+            self.sent += 1
+            sequence += 1
+            next_send += interval # fixed schedule, a late send does not push back the following ones
+
+        await asyncio.sleep(self.grace) # let messages in flight arrive
+        receive_task.cancel()
+        writer.close()
+
+    async def receive(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            frame = await read_frame(reader)
+            if frame is None:
+                break
+            if frame[0] == MESSAGE:
+                self.decrypt_message(frame[1])
+
+    async def run_async(self, grace: float) -> None:
+        self.grace = grace
+        joined = []
+        tasks = [asyncio.create_task(self.client(number, joined)) for number in range(self.clients)]
+        while len(joined) < self.clients:
+            await asyncio.sleep(0.01)
+
+        start_cpu = time.process_time()
+        start_time = time.perf_counter()
+        await asyncio.sleep(self.duration)
+        self.running = False
+        self.elapsed = time.perf_counter() - start_time
+        await asyncio.gather(*tasks)
+        self.cpu_seconds = time.process_time() - start_cpu
+
+    def run(self, grace=2.0) -> dict:
+        asyncio.run(self.run_async(grace))
+        return self.report()
+
+    def report(self) -> dict:
+        latencies = sorted(self.latencies)
+        expected = self.sent * (self.clients - 1) # a broadcast reaches everyone but the sender
+        crypto = self.encrypt_seconds + self.decrypt_seconds
+        return {
+            "config": {"clients": self.clients, "rate": self.rate, "size": self.size, "duration": self.duration,
+                       "engine": self.aes.engine_name, "key_bits": 8 * len(self.aes.key), "cbc": self.cbc, "compress": self.compress},
+            "sent": self.sent, "delivered": self.delivered, "lost": expected - self.delivered,
+            "sent_per_second": round(self.sent / self.elapsed, 2), "delivered_per_second": round(self.delivered / self.elapsed, 2),
+            "latency_ms": {name: round(1000 * percentile(latencies, q), 3) for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+            "cpu_seconds": {
+                "load_generator": round(self.cpu_seconds, 3), "encrypt": round(self.encrypt_seconds, 3), "decrypt": round(self.decrypt_seconds, 3),
+                "io": round(self.cpu_seconds - crypto, 3), # sockets, framing and the event loop
+            },
+        }
+
+def main(args) -> dict:
+    server_data = json.load(open("apps/sockets/config.json")) # opens data from config
+    host, port = args.host or server_data["Host"], args.port or server_data["Port"]
+
+    server = None
+    if not args.external:
+        server = multiprocessing.Process(target=run_server, args=(host, port, server_data, args.workers))
+        server.start()
+        time.sleep(args.startup) # let the server (and its workers) bind
+
+    try:
+        report = LoadTest(host, port, args.clients, args.rate, args.size, args.duration, args.engine, server_data.get("Compress", False)).run(args.grace)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+
+    report["server"] = args.label or ("external" if args.external else f"asyncio x{args.workers}" if args.workers > 1 else "asyncio")
+    if server is not None: # the server process has been reaped, so its cpu time is in the children usage
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        report["cpu_seconds"]["server"] = round(usage.ru_utime + usage.ru_stime, 3)
+    return report
+
+if __name__ == "__main__":
+    """Run the file by copying into your terminal: python3 apps/sockets/src/load_test.py --clients 50 --rate 5 --duration 10"""
+    # create the parser
+    parser = argparse.ArgumentParser(description='Load test the chat server with simulated clients and print a json report.')
+    # add arguments
+    parser.add_argument("--clients", type=int, default=20, help="simulated clients")
+    parser.add_argument("--rate", type=float, default=5.0, help="messages per second sent by each client")
+    parser.add_argument("--size", type=int, default=64, help="plaintext bytes per message")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of sending")
+    parser.add_argument("--grace", type=float, default=2.0, help="seconds to wait for messages in flight after sending stops")
+    parser.add_argument("--engine", default="table", help="AES engine used by the simulated clients")
+    parser.add_argument("--host", default=None, help="server host (default from apps/sockets/config.json)")
+    parser.add_argument("--port", type=int, default=None, help="server port (default from apps/sockets/config.json)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes of the started server (sharded server when more than 1)")
+    parser.add_argument("--external", action="store_true", help="test a server that is already running instead of starting one")
+    parser.add_argument("--startup", type=float, default=0.5, help="seconds to wait for the started server to listen")
+    parser.add_argument("--label", default=None, help="name of the server implementation in the report")
+    parser.add_argument("--out", default=None, help="write the report to this file instead of stdout")
+    # parse the arguments
+    args = parser.parse_args()
+
+    report = json.dumps(main(args), indent=4)
+    if args.out:
+        with open(args.out, "w") as FILE:
+            FILE.write(report)
+    else:
+        print(report)
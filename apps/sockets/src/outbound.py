@@ -0,0 +1,97 @@
+import asyncio
+from collections import deque
+
+# local packages
+from apps.sockets.src.protocol import BULK
+
+## OUTBOUND QUEUES ##
+POLICIES = ("drop_oldest", "disconnect", "block") # what happens when a client's queue is full
+BULK_BATCH = 1 << 18 # bulk bytes per write, chat frames queued meanwhile go out with the next write
+
+class OutboundQueue:
+    """Bounded queue of encoded frames for one client, drained by its own writer task.
+    A slow client only fills its own queue, everyone else keeps receiving.
+    Bulk frames (file transfers) wait in their own queue and only fill what is left of each write after the chat frames."""
+    def __init__(self, writer: asyncio.StreamWriter, max_frames=1024, policy="drop_oldest") -> None:
+        assert policy in POLICIES, f"Invalid overflow policy. Allowed policies are {', '.join(POLICIES)}."
+        self.writer = writer
+        self.max_frames = max_frames
+        self.policy = policy
+        self.frames = deque() # shared frame bytes, a broadcast puts the same object in every queue
+        self.bulk = deque() # transfer frames, in order among themselves
+        self.ready = asyncio.Event() # frames are waiting
+        self.space = asyncio.Event() # the queue is below max_frames (block policy)
+        self.space.set()
+        self.closed = False
+
+        # metrics
+        self.peak = 0
+        self.dropped = 0
+        self.sent = 0
+        self.bytes = 0
+
+        self.task = asyncio.create_task(self.drain())
+
+    def put(self, frame: bytes) -> bool:
+        """Queue a frame without waiting. False when it was not queued (closed, or full under the block policy)."""
+        if self.closed:
+            return False
+        frames = self.bulk if frame[:1] and frame[0] in BULK else self.frames
+        if len(frames) >= self.max_frames:
+            if self.policy == "drop_oldest":
+                frames.popleft()
+                self.dropped += 1
+            elif self.policy == "disconnect":
+                self.close(abort=True)
+                return False
+            else:
+                self.space.clear()
+                return False
+        frames.append(frame)
+        self.peak = max(self.peak, len(self.frames) + len(self.bulk))
+        self.ready.set()
+        return True
+
+    async def put_wait(self, frame: bytes) -> None:
+        """Queue a frame, waiting for room when the queue is full (block policy)."""
+        while not self.put(frame) and not self.closed:
+            await self.space.wait()
+
+    async def drain(self) -> None:
+        """Writer task, sends everything queued as one write and waits for the socket before the next batch."""
+        try:
+            while True:
+                await self.ready.wait()
+                batch = list(self.frames)
+                self.frames.clear()
+                size = 0
+                while self.bulk and size < BULK_BATCH:
+                    batch.append(self.bulk.popleft())
+                    size += len(batch[-1])
+                if not self.bulk:
+                    self.ready.clear()
+                self.space.set()
+
+                data = b"".join(batch) # coalesced, one syscall per batch
+                self.writer.write(data)
+                self.sent += len(batch)
+                self.bytes += len(data)
+                await self.writer.drain() # backpressure, a slow reader pauses only this task
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def close(self, abort=False) -> None:
+        """Stop the writer task. abort drops unsent data, close() would wait for a client that is not reading."""
+        if not self.closed:
+            self.closed = True
+            self.task.cancel()
+            self.frames.clear()
+            self.bulk.clear()
+            self.space.set() # release anyone blocked on this queue
+            if abort:
+                self.writer.transport.abort() # the server's read loop sees the connection end and removes the client
+            else:
+                self.writer.close()
+
+    def stats(self) -> dict:
+        return {"depth": len(self.frames) + len(self.bulk), "peak": self.peak, "dropped": self.dropped, "sent": self.sent, "bytes": self.bytes}
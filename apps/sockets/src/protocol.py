@@ -0,0 +1,71 @@
+import asyncio, struct
+
+## FRAMING ##
+# every frame is type (1 byte) | length (4 bytes) | payload, so messages survive TCP merging and splitting them
+HEADER = struct.Struct(">BI")
+MAX_FRAME = 1 << 24 # larger lengths mean a broken or hostile peer
+
+# frame types
+NAME = 1 # client -> server, user name (first frame)
+NOTICE = 2 # server -> client, plain text notice (connected list, joins, leaves)
+MESSAGE = 3 # ciphertext, relayed by the server as is
+FILE_START = 4 # file transfers (see transfer.py), relayed as is
+FILE_CHUNK = 5
+FILE_END = 6
+RELAYED = (MESSAGE, FILE_START, FILE_CHUNK, FILE_END) # client frames the server broadcasts
+BULK = (FILE_START, FILE_CHUNK, FILE_END) # sent after any waiting chat frames, so a transfer never holds up chat
+
+def encode_frame(frame_type: int, payload: bytes) -> bytes:
+    return HEADER.pack(frame_type, len(payload)) + payload
+
+class FrameReader:
+    """Buffers received bytes and returns only whole frames, partial frames wait for the next feed()."""
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """Add received bytes, returns every complete (type, payload) frame."""
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            frame_type, length = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME:
+                raise ValueError(f"Frame of {length} bytes is over the {MAX_FRAME} byte limit.")
+            if len(self.buffer) - offset - HEADER.size < length:
+                break # rest of the frame has not arrived yet
+            start = offset + HEADER.size
+            frames.append((frame_type, bytes(self.buffer[start: start + length])))
+            offset = start + length
+        del self.buffer[:offset]
+        return frames
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Read one (type, payload) frame from an asyncio stream, None when the peer closed the connection."""
+    try:
+        frame_type, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+        if length > MAX_FRAME:
+            raise ValueError(f"Frame of {length} bytes is over the {MAX_FRAME} byte limit.")
+        return frame_type, await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+class FrameWriter:
+    """Collects frames and writes them with one call per flush, so several frames sent together cost one syscall.
+    The server coalesces through each client's OutboundQueue instead."""
+    def __init__(self, write) -> None:
+        self.write = write # sock.sendall or StreamWriter.write
+        self.pending = []
+
+    def send(self, frame_type: int, payload: bytes) -> None:
+        self.send_frame(encode_frame(frame_type, payload))
+
+    def send_frame(self, frame: bytes) -> None:
+        """Queue an already encoded frame, it is written on the next flush()."""
+        self.pending.append(frame)
+
+    def flush(self) -> None:
+        if self.pending:
+            data = b"".join(self.pending)
+            self.pending.clear()
+            self.write(data)
@@ -1,74 +1,137 @@
+import argparse, asyncio, json
+import sys
+sys.path.append('../applications-of-aes') # path to apps
 
-import socket, threading, json
+# local packages
+from aes.src.metrics import METRICS
+from apps.sockets.src.history import History
+from apps.sockets.src.outbound import OutboundQueue
+from apps.sockets.src.protocol import NAME, NOTICE, MESSAGE, RELAYED, encode_frame, read_frame
+from apps.utils import start_metrics
 
 class Server:
-    def __init__(self, host: str, port: int, max_connections: int) -> None:
+    def __init__(self, host: str, port: int, max_connections: int, queue_size=1024, overflow="drop_oldest", history_frames=256, history_bytes=1 << 20) -> None:
         self.host = host
         self.port = port
-        self.max_connections = max_connections
-        
-        self.connected_users = {}
+        self.max_connections = max_connections # pending connections the listening socket queues
+        self.queue_size = queue_size # frames each client may have waiting
+        self.overflow = overflow # drop_oldest, disconnect or block (the sender waits for the slow client)
 
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connected_users = {} # OutboundQueue -> name, only changed on the event loop so broadcasts never race with joins
+        METRICS.register("chat_queues", self.queue_stats)
+
+        # recent messages replayed to new clients, turned off when either limit is 0
+        self.history = History(history_frames, history_bytes) if history_frames and history_bytes else None
+        if self.history is not None:
+            METRICS.register("chat_history", self.history.stats)
 
     def run(self) -> None:
         """Starting method of the server."""
-        self.connect()
+        asyncio.run(self.serve())
 
-        # opens when a client connects to the server
-        while True:
-            client_socket, client_address = self.server_socket.accept()
-            client_name = client_socket.recv(1024).decode()
-            print(f"Client connected [{client_address}: {client_name}]")
+    async def serve(self) -> None:
+        """Turns the server on, one event loop handles every connection."""
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=self.max_connections)
 
-            connected_message = "Connected:\n\t" + "\n\t".join(list(self.connected_users.values()))
-            client_socket.send(connected_message.encode())
- 
-            self.connected_users[client_socket] = client_name # adds user to connected users
+        print(f"=====\nServer Live!\nHost: {self.host}\nPort: {self.port}\n=====\n")
 
-            thread = threading.Thread(target=self.handle_client, args=(client_socket, client_address))
-            thread.start()
+        async with server:
+            await server.serve_forever()
 
-    def connect(self) -> None:
-        """Turns the server on."""
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(self.max_connections)
+    async def broadcast(self, frame: bytes, sender=None) -> None:
+        """Queue one encoded frame (shared, not copied) to every connected client except the sender.
+        Only the block policy ever waits, and only for the clients that are full."""
+        full = []
+        for client in list(self.connected_users): # copy, a client may leave while this runs
+            if client is not sender and not client.put(frame) and self.overflow == "block":
+                full.append(client)
+        for client in full:
+            await client.put_wait(frame)
+        await asyncio.sleep(0) # let the writer tasks run, a burst from one sender must not fill every queue before anything is sent
 
-        print(f"=====\nServer Live!\nHost: {self.host}\nPort: {self.port}\n=====\n")
+    def connected_names(self) -> list:
+        return list(self.connected_users.values())
+
+    async def add_user(self, client: OutboundQueue, name: str) -> None:
+        self.connected_users[client] = name
+
+    async def remove_user(self, client: OutboundQueue) -> None:
+        del self.connected_users[client]
+
+    def queue_stats(self) -> list:
+        """Queue depth, peak, dropped frames and bytes sent for every client."""
+        return [{"name": name, **client.stats()} for client, name in list(self.connected_users.items())]
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handles the frames sent by one client."""
+        client_address = writer.get_extra_info("peername")
+        try:
+            first_frame = await read_frame(reader)
+            client_name = first_frame[1].decode() if first_frame is not None and first_frame[0] == NAME else None
+        except (ConnectionError, ValueError): # gone before its name, an oversized frame or a name that is not utf-8
+            client_name = None
+        if client_name is None:
+            writer.close()
+            return
+        print(f"Client connected [{client_address}: {client_name}]")
+
+        # everything sent to this client goes through its own bounded queue and writer task
+        client = OutboundQueue(writer, self.queue_size, self.overflow)
+        connected_message = "Connected:\n\t" + "\n\t".join(self.connected_names())
+        client.put(encode_frame(NOTICE, connected_message.encode()))
+        if self.history is not None:
+            backlog = self.history.replay()
+            if backlog:
+                client.put(backlog) # every stored frame in one write, before any new message can be queued
+
+        try:
+            await self.add_user(client, client_name) # adds user to connected users, first in the try so finally always removes it
 
-    def handle_client(self, client_socket, client_address) -> None:
-        """Handles the messages sent by the clients."""
-        with client_socket:
             # Broadcast the join message to all connected clients
-            client_name = self.connected_users[client_socket]
-            for client in self.connected_users.keys():
-                if client != client_socket:
-                    client.send(f"[Server] {client_name} joined the server.".encode())
+            await self.broadcast(encode_frame(NOTICE, f"{client_name} joined the server.".encode()), client)
 
             while True:
-                data = client_socket.recv(4096) # recieves text
+                frame = await read_frame(reader) # recieves one whole message
                 # allows the server to know when a client disconnects
-                if not data:
+                if frame is None:
                     break
-                print(f"[{client_name}] {data}")
-                # Send the received data to all connected clients except the sender
-                for client in self.connected_users.keys():
-                    if client != client_socket:
-                        client.send(data) # message
+                frame_type, payload = frame
+                if frame_type in RELAYED:
+                    # Send the received data to all connected clients except the sender
+                    frame = encode_frame(frame_type, payload)
+                    if frame_type == MESSAGE:
+                        print(f"[{client_name}] {payload}")
+                        if self.history is not None:
+                            self.history.append(frame) # kept encrypted, the server has no key (file transfers are not kept)
+                    await self.broadcast(frame, client) # message or file transfer
+        except (ConnectionError, ValueError):
+            pass # the client went away without closing cleanly, or sent a broken frame
+        finally:
+            await self.remove_user(client)
+            client.close()
 
             # Notify all clients when someone disconnects
-            for client in self.connected_users.keys():
-                if client != client_socket:
-                    client.send(f"[Server] {client_name} has disconnected.".encode())
+            await self.broadcast(encode_frame(NOTICE, f"{client_name} has disconnected.".encode()), client)
 
-            del self.connected_users[client_socket]
             print(f"Client disconnected [{client_address}]")
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description='Encrypted chat server.')
+    parser.add_argument("--workers", type=int, default=None, help="worker processes sharing the port (default Workers in config.json, 1)")
+    args = parser.parse_args()
+
     server_data = json.load(open("apps/sockets/config.json")) # opens data from config
+    settings = (server_data.get("QueueSize", 1024), server_data.get("Overflow", "drop_oldest"), server_data.get("HistoryFrames", 256), server_data.get("HistoryBytes", 1 << 20))
+    workers = args.workers or server_data.get("Workers", 1)
     # server object
-    server = Server(server_data["Host"], server_data["Port"], 5)
+    if workers > 1:
+        from apps.sockets.src.sharded import ShardedServer # imports this module
+        server = ShardedServer(server_data["Host"], server_data["Port"], 1024, workers, *settings)
+    else:
+        server = Server(server_data["Host"], server_data["Port"], 1024, *settings)
+        start_metrics() # optional metrics, AES_METRICS_PORT also serves the per client queue stats
     server.run()
 
 if __name__ == "__main__":
     main()
+
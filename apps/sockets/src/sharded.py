@@ -0,0 +1,130 @@
+import asyncio, multiprocessing, signal, socket, sys
+from collections import Counter
+sys.path.append('../applications-of-aes') # path to apps
+
+# local packages
+from apps.sockets.src.outbound import OutboundQueue
+from apps.sockets.src.protocol import MESSAGE, encode_frame, read_frame
+from apps.sockets.src.server import Server
+
+## SHARDED SERVER ##
+# every worker accepts on the same port (SO_REUSEPORT, the kernel spreads connections over them) and owns its clients,
+# workers are connected to each other by unix socket pairs and forward every broadcast and roster change over them
+
+# frame types between workers
+PEER_FRAME = 16 # payload is a client frame to broadcast
+PEER_JOIN = 17 # payload is the name of a client that joined another worker
+PEER_LEAVE = 18 # payload is the name of a client that left another worker
+
+class WorkerServer(Server):
+    """Server for one worker process, a broadcast reaches its own clients and is forwarded to every other worker."""
+    def __init__(self, host: str, port: int, max_connections: int, peer_sockets: list, *args) -> None:
+        super().__init__(host, port, max_connections, *args)
+        self.peer_sockets = peer_sockets # one unix socket per other worker
+        self.peers = []
+        self.remote_users = Counter() # names connected to other workers (names may repeat)
+
+    async def connect_peers(self) -> None:
+        """Starts forwarding to and receiving from every other worker."""
+        for peer_socket in self.peer_sockets:
+            reader, writer = await asyncio.open_unix_connection(sock=peer_socket)
+            self.peers.append(OutboundQueue(writer, 4 * self.queue_size, "block")) # workers never drop each other's frames
+            asyncio.create_task(self.receive_peer(reader))
+
+    async def serve(self) -> None:
+        """Connects to the other workers, then accepts on the shared port."""
+        await self.connect_peers()
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=self.max_connections, reuse_port=True)
+
+        async with server:
+            await server.serve_forever()
+
+    async def publish(self, frame_type: int, payload: bytes) -> None:
+        """Send one frame to every other worker, waits only if a worker is far behind."""
+        frame = encode_frame(frame_type, payload)
+        for peer in self.peers:
+            await peer.put_wait(frame)
+
+    async def broadcast(self, frame: bytes, sender=None) -> None:
+        await self.publish(PEER_FRAME, frame)
+        await super().broadcast(frame, sender)
+
+    async def receive_peer(self, reader: asyncio.StreamReader) -> None:
+        """Applies what another worker sends, to this worker's clients only (never forwarded again)."""
+        while True:
+            try:
+                frame = await read_frame(reader)
+            except ConnectionError:
+                frame = None # the other worker stopped
+            if frame is None:
+                break
+            frame_type, payload = frame
+            if frame_type == PEER_FRAME:
+                if self.history is not None and payload[0] == MESSAGE:
+                    self.history.append(payload)
+                await super().broadcast(payload)
+            elif frame_type == PEER_JOIN:
+                self.remote_users[payload.decode()] += 1
+            elif frame_type == PEER_LEAVE:
+                name = payload.decode()
+                self.remote_users[name] -= 1
+                if self.remote_users[name] <= 0:
+                    del self.remote_users[name]
+
+    def connected_names(self) -> list:
+        return super().connected_names() + list(self.remote_users.elements())
+
+    async def add_user(self, client: OutboundQueue, name: str) -> None:
+        await super().add_user(client, name) # local roster changes before anything waits
+        await self.publish(PEER_JOIN, name.encode()) # waits for room rather than dropping, or the rosters would diverge
+
+    async def remove_user(self, client: OutboundQueue) -> None:
+        name = self.connected_users[client]
+        await super().remove_user(client)
+        await self.publish(PEER_LEAVE, name.encode())
+
+def run_worker(number: int, sockets: list, host: str, port: int, max_connections: int, args: tuple) -> None:
+    """Worker process, keeps its own end of every pair and closes the rest so a dead worker is noticed."""
+    own = [pair[0] if pair_number[0] == number else pair[1] for pair_number, pair in sockets if number in pair_number]
+    for pair_number, pair in sockets:
+        for end in pair:
+            if end not in own:
+                end.close()
+    WorkerServer(host, port, max_connections, own, *args).run()
+
+class ShardedServer:
+    """Runs worker processes of WorkerServer on one port, same joins, leaves and broadcasts as Server."""
+    def __init__(self, host: str, port: int, max_connections: int, workers: int, *args) -> None:
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.workers = workers
+        self.args = args # queue size, overflow, history limits (see Server)
+
+    def run(self) -> None:
+        """Starting method of the server, returns when every worker has stopped."""
+        # a socket pair between every two workers, pair_number (i, j) gives i the first end and j the second
+        sockets = []
+        for first in range(self.workers):
+            for second in range(first + 1, self.workers):
+                sockets.append(((first, second), socket.socketpair(socket.AF_UNIX)))
+
+        context = multiprocessing.get_context("fork") # workers inherit the socket pairs
+        processes = [context.Process(target=run_worker, args=(number, sockets, self.host, self.port, self.max_connections, self.args))
+                     for number in range(self.workers)]
+        for process in processes:
+            process.start()
+        for _, pair in sockets: # only the workers use them
+            for end in pair:
+                end.close()
+
+        print(f"=====\nServer Live!\nHost: {self.host}\nPort: {self.port}\nWorkers: {self.workers}\n=====\n")
+
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0)) # stopping this process stops the workers too
+        try:
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
@@ -0,0 +1,175 @@
+import json, os, queue, threading, time
+from pathlib import Path
+
+# local packages
+from aes import AES
+from apps.sockets.src.protocol import FILE_START, FILE_CHUNK, FILE_END, encode_frame
+
+## TRANSFERS ##
+# a file is sent as FILE_START (encrypted name and size), FILE_CHUNK frames and FILE_END (encrypted chunk count),
+# every payload is transfer id (8 bytes) | index (4 bytes) | nonce (12 bytes) | gcm ciphertext and tag,
+# the id, frame type and index are authenticated so chunks cannot be reordered, dropped or moved to another transfer
+CHUNK_SIZE = 1 << 16 # plaintext bytes per chunk, a chat message waits at most one chunk
+PIPELINE_DEPTH = 4 # chunks encrypted ahead of the socket
+MAX_TRANSFERS = 8 # incoming transfers at the same time, each holds one open file and no more than one chunk in memory
+PROGRESS_INTERVAL = 1.0 # seconds between progress lines
+
+def transfer_engine(key) -> AES:
+    """GCM over whole chunks is batched work, fastest on numpy (optional), otherwise tables."""
+    try:
+        return AES(key, "numpy")
+    except ImportError:
+        return AES(key, "table")
+
+def seal(aes: AES, transfer_id: bytes, frame_type: int, index: int, data: bytes) -> bytes:
+    header = transfer_id + index.to_bytes(4, "big")
+    nonce = os.urandom(12)
+    return header + nonce + aes.encrypt_gcm(data, nonce, header + bytes([frame_type]))
+
+def unseal(aes: AES, frame_type: int, payload: bytes) -> tuple:
+    """(transfer id, index, plaintext), raises ValueError if anything was modified."""
+    header, nonce = payload[:12], payload[12:24]
+    return header[:8], int.from_bytes(header[8:], "big"), aes.decrypt_gcm(payload[24:], nonce, header + bytes([frame_type]))
+
+class Progress:
+    """Prints bytes done, percent and MB/s at most once per interval."""
+    def __init__(self, label: str, total: int, interval=PROGRESS_INTERVAL) -> None:
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.start_time = time.perf_counter()
+        self.printed = self.start_time
+
+    def update(self, count: int) -> None:
+        self.done += count
+        now = time.perf_counter()
+        if now - self.printed >= self.interval:
+            self.printed = now
+            percent = 100 * self.done / self.total if self.total else 100
+            print(f"{self.label}: {self.done / 1e6:.1f}/{self.total / 1e6:.1f} MB ({percent:.0f}%), {self.rate():.2f} MB/s")
+
+    def rate(self) -> float:
+        return self.done / 1e6 / max(time.perf_counter() - self.start_time, 1e-9)
+
+    def summary(self) -> str:
+        return f"{self.label}: {self.done / 1e6:.2f} MB in {time.perf_counter() - self.start_time:.2f}s ({self.rate():.2f} MB/s)"
+
+class Sender:
+    """Encrypted frames of one file, read and encrypted one chunk at a time."""
+    def __init__(self, aes: AES, path: str, user_name: str, chunk_size=CHUNK_SIZE) -> None:
+        self.aes = aes
+        self.path = path
+        self.user_name = user_name
+        self.chunk_size = chunk_size
+        self.transfer_id = os.urandom(8)
+        self.size = os.path.getsize(path)
+        self.progress = Progress(f"Sending {Path(path).name}", self.size)
+
+    def frames(self):
+        """Yields (frame, plaintext bytes) for the start, every chunk and the end."""
+        metadata = json.dumps({"name": Path(self.path).name, "size": self.size, "sender": self.user_name}).encode()
+        yield encode_frame(FILE_START, seal(self.aes, self.transfer_id, FILE_START, 0, metadata)), 0
+
+        index = 0
+        with open(self.path, "rb") as FILE:
+            while True:
+                chunk = FILE.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield encode_frame(FILE_CHUNK, seal(self.aes, self.transfer_id, FILE_CHUNK, index, chunk)), len(chunk)
+                index += 1
+
+        yield encode_frame(FILE_END, seal(self.aes, self.transfer_id, FILE_END, index, index.to_bytes(4, "big"))), 0
+
+def pipeline(frames, depth=PIPELINE_DEPTH):
+    """Runs the frames generator on a thread, depth frames ahead, so encrypting the next chunk overlaps sending this one."""
+    pending = queue.Queue(depth)
+    done = object()
+
+    def produce() -> None:
+        try:
+            for item in frames:
+                pending.put(item)
+        finally:
+            pending.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = pending.get()
+        if item is done:
+            return
+        yield item
+
+class Receiver:
+    """Reassembles incoming transfers straight into files, decrypting each chunk as it arrives."""
+    def __init__(self, aes: AES, directory="downloads", max_transfers=MAX_TRANSFERS) -> None:
+        self.aes = aes
+        self.directory = Path(directory)
+        self.max_transfers = max_transfers
+        self.active = {} # transfer id -> [file, path, size, next index, Progress]
+
+    def handle(self, frame_type: int, payload: bytes) -> None:
+        try:
+            transfer_id, index, data = unseal(self.aes, frame_type, payload)
+        except ValueError:
+            transfer_id = payload[:8]
+            self.abort(transfer_id, "a chunk failed authentication")
+            return
+
+        if frame_type == FILE_START:
+            try:
+                self.start(transfer_id, json.loads(data))
+            except (ValueError, KeyError, TypeError): # authentic but unusable metadata, only this transfer is lost
+                self.abort(transfer_id, "its metadata could not be read")
+                print("[Transfer] Ignoring a transfer with unreadable metadata.")
+            return
+
+        transfer = self.active.get(transfer_id)
+        if transfer is None:
+            return # started before this client joined, or already aborted
+        FILE, path, size, expected, progress = transfer
+        if frame_type == FILE_CHUNK:
+            if index != expected:
+                self.abort(transfer_id, "chunks were dropped (the receiver fell behind)")
+                return
+            FILE.write(data)
+            transfer[3] += 1
+            progress.update(len(data))
+        elif frame_type == FILE_END:
+            FILE.close()
+            del self.active[transfer_id]
+            if int.from_bytes(data, "big") != expected or progress.done != size:
+                os.remove(path.with_name(path.name + ".part"))
+                print(f"[Transfer] {path.name} is incomplete, discarded.")
+                return
+            os.replace(path.with_name(path.name + ".part"), path) # only whole files appear under their name
+            print(f"[Transfer] Saved {path}. {progress.summary()}")
+
+    def start(self, transfer_id: bytes, metadata: dict) -> None:
+        """Opens the .part file of a new transfer, raises ValueError, KeyError or TypeError if the metadata is not usable."""
+        name = Path(metadata["name"]).name or "file" # never a path from the sender
+        size, sender = int(metadata["size"]), str(metadata["sender"])
+        if len(self.active) >= self.max_transfers:
+            print(f"[Transfer] Ignoring {name} from {sender}, {self.max_transfers} transfers already running.")
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        copy = 1
+        while path.exists() or path.with_name(path.name + ".part").exists(): # keep earlier files
+            path = self.directory / f"{Path(name).stem} ({copy}){Path(name).suffix}"
+            copy += 1
+        print(f"[Transfer] {sender} is sending {name} ({size / 1e6:.2f} MB)")
+        self.active[transfer_id] = [open(path.with_name(path.name + ".part"), "wb"), path, size, 0, Progress(f"Receiving {name}", size)]
+
+    def abort(self, transfer_id: bytes, reason: str) -> None:
+        transfer = self.active.pop(transfer_id, None)
+        if transfer is not None:
+            transfer[0].close()
+            os.remove(transfer[1].with_name(transfer[1].name + ".part"))
+            print(f"[Transfer] {transfer[1].name} failed, {reason}.")
+
+    def close(self) -> None:
+        """Drops unfinished transfers (their .part files are removed)."""
+        for transfer_id in list(self.active):
+            self.abort(transfer_id, "the connection closed")
@@ -0,0 +1,40 @@
+import argparse, sys
+sys.path.append('../applications-of-aes') # path to aes
+
+# local packages
+from aes import AES
+from aes.src.records import open_log
+from apps.utils import load_encryption_settings, start_metrics
+
+def append_lines(aes: AES, file: str, lines: list, cbc=False) -> None:
+    """Appends each line as its own encrypted record, earlier records are never read or rewritten."""
+    with open_log(file, aes, "a", "cbc" if cbc else "gcm") as log: # new logs use the mode from config.json
+        for line in lines:
+            log.append(line)
+
+def read_lines(aes: AES, file: str, skip=0) -> None:
+    """Prints the records one at a time, skipped records are not decrypted."""
+    with open_log(file, aes) as log:
+        for record in log.records(skip):
+            print(record.decode("utf-8"))
+
+if __name__ == "__main__":
+    """Run the file by copying into your terminal: python3 apps/textfiles/src/append_log.py audit.bin "user logged in" """
+    # create the parser
+    parser = argparse.ArgumentParser(description='Append lines to an encrypted log, or read it back.')
+    # add arguments
+    parser.add_argument("file", help="encrypted log file (created when missing)")
+    parser.add_argument("lines", nargs="*", help="lines to append (reads from stdin when none are given)")
+    parser.add_argument("--read", action="store_true", help="print the log instead of appending")
+    parser.add_argument("--skip", type=int, default=0, help="records to skip when reading")
+    # parse the arguments
+    args = parser.parse_args()
+
+    start_metrics() # optional metrics (AES_METRICS, AES_METRICS_PORT, AES_METRICS_FILE)
+    aes_key, cbc, iv = load_encryption_settings() # gets key from config.json for encryption
+    aes = AES(aes_key, "table")
+
+    if args.read:
+        read_lines(aes, args.file, args.skip)
+    else:
+        append_lines(aes, args.file, args.lines or [line.rstrip("\n") for line in sys.stdin], cbc)
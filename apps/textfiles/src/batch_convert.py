@@ -0,0 +1,101 @@
+from pathlib import Path
+import argparse, multiprocessing, os, sys, time
+sys.path.append('../applications-of-aes') # path to aes
+
+# local packages
+from aes.src import parallel
+from apps.textfiles.src.convert_file import container_file, fastest_engine
+from apps.utils import load_encryption_settings, start_metrics
+
+SLOWEST = 5 # files listed in the report
+
+def plan(source: Path, target: Path, encrypt: bool) -> list:
+    """Every (input, output) pair under source. Encryption adds .bin, decryption converts .bin files and strips it."""
+    jobs = []
+    for path in sorted(source.rglob("*")):
+        if not path.is_file() or (not encrypt and path.suffix != ".bin"):
+            continue
+        relative = path.relative_to(source)
+        output = target / (str(relative) + ".bin" if encrypt else str(relative)[:-4])
+        jobs.append((path, output))
+    return jobs
+
+def is_done(file_in: Path, file_out: Path) -> bool:
+    """Outputs only appear once complete (renamed from .part), so an output newer than its input is finished."""
+    return file_out.is_file() and file_out.stat().st_mtime >= file_in.stat().st_mtime
+
+def convert(job: tuple) -> tuple:
+    """Runs in a worker, converts one file through a temporary .part file. Returns (input, bytes, seconds, success)."""
+    file_in, file_out, encrypt, cipher_mode, compress = job
+    partial = file_out.with_name(file_out.name + ".part")
+    file_out.parent.mkdir(parents=True, exist_ok=True)
+
+    start_time = time.perf_counter()
+    success = False
+    try:
+        success = container_file([parallel.WORKER, None, None], str(file_in), str(partial), encrypt, cipher_mode, compress)
+        if success:
+            os.replace(partial, file_out) # atomic, an interrupted run never leaves a half written output
+    finally:
+        if not success:
+            partial.unlink(missing_ok=True) # a failed conversion leaves nothing behind in the target tree
+    execution_time = time.perf_counter() - start_time
+    return (str(file_in), file_in.stat().st_size, execution_time, success)
+
+def batch_convert(source: str, target: str, encrypt=True, cipher_mode="gcm", processes=None, compress=None) -> dict:
+    """Encrypts (or decrypts) a whole directory tree into target using a worker pool. Finished files are skipped, so reruns resume."""
+    source, target = Path(source), Path(target)
+    assert source.is_dir(), "Specified input directory does not exist."
+
+    jobs = plan(source, target, encrypt)
+    pending = [(file_in, file_out, encrypt, cipher_mode, compress) for file_in, file_out in jobs if not is_done(file_in, file_out)]
+
+    # the key is expanded once here and handed to every worker
+    aes_key = load_encryption_settings()[0] # gets key from config.json for encryption
+    aes = fastest_engine(aes_key, not (cipher_mode == "cbc" and encrypt))
+    arguments = (aes.key, aes.engine_name, aes.expanded_key, aes.rounds)
+
+    results = []
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(processes or os.cpu_count(), initializer=parallel.start_worker, initargs=arguments) as pool:
+        for result in pool.imap_unordered(convert, pending, chunksize=8):
+            results.append(result)
+    execution_time = time.perf_counter() - start_time
+
+    converted = [result for result in results if result[3]]
+    size = sum(result[1] for result in converted)
+    return {
+        "files": len(converted), "skipped": len(jobs) - len(pending), "failed": [result[0] for result in results if not result[3]],
+        "bytes": size, "seconds": execution_time,
+        "files_per_second": len(converted) / max(execution_time, 1e-9), "mb_per_second": size / 1e6 / max(execution_time, 1e-9),
+        "slowest": sorted(((result[0], result[2]) for result in converted), key=lambda item: -item[1])[:SLOWEST],
+    }
+
+def print_report(report: dict) -> None:
+    print(f"Converted {report['files']} files ({report['bytes'] / 1e6:.2f} MB) in {report['seconds']:.2f}s, skipped {report['skipped']} finished files")
+    print(f"{report['files_per_second']:.1f} files/s, {report['mb_per_second']:.2f} MB/s")
+    if report["slowest"]:
+        print("Slowest files:")
+        for file, seconds in report["slowest"]:
+            print(f"\t{seconds:8.3f}s  {file}")
+    if report["failed"]:
+        print(f"{len(report['failed'])} files failed (rerun to retry):")
+        for file in report["failed"]:
+            print(f"\t{file}")
+
+if __name__ == "__main__":
+    """Run the file by copying into your terminal: python3 apps/textfiles/src/batch_convert.py logs/ logs_encrypted/"""
+    # create the parser
+    parser = argparse.ArgumentParser(description='Encrypt or decrypt a whole directory tree into containers. Interrupted runs resume where they stopped.')
+    # add arguments
+    parser.add_argument("source", help="directory to convert")
+    parser.add_argument("target", help="directory for the output (same layout as source)")
+    parser.add_argument("--decrypt", action="store_true", help="decrypt the .bin files in source")
+    parser.add_argument("--container", default="gcm", choices=["gcm", "ctr", "cbc"], help="container mode used when encrypting")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default one per core)")
+    parser.add_argument("--compress", nargs="?", const="zlib", choices=["zlib", "lzma"], help="compress each chunk before encrypting (skipped when it does not help)")
+    # parse the arguments
+    args = parser.parse_args()
+
+    start_metrics() # optional metrics (AES_METRICS, AES_METRICS_PORT, AES_METRICS_FILE)
+    print_report(batch_convert(args.source, args.target, not args.decrypt, args.container, args.processes, args.compress))
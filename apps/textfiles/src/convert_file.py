@@ -1,11 +1,15 @@
 
 from pathlib import Path
-import sys
+import argparse, codecs, contextlib, mmap, sys, time
 sys.path.append('../applications-of-aes') # path to aes
 
 # local packages
 from aes import AES
-from apps.utils import load_encryption_settings
+from aes.src.container import ContainerReader, ContainerWriter, is_container
+from apps.utils import load_encryption_settings, start_metrics
+
+CHUNK_SIZE = 1 << 16 # characters / bytes read per piece, memory stays flat for any file size
+WINDOW_SIZE = 1 << 22 # bytes of the memory mapped input handled per step in streaming mode (multiple of 16)
 
 def is_file(file_name: str) -> bool:
     """Ensures that the files exist."""
@@ -19,12 +23,15 @@ def encrypt_file(args: list, file_in: str, file_out: str) -> bool:
             # write cbc differently than ecb because of the iv
             if cbc:
                 try:
-                    FILE_WRITE.write(aes.encrypt(FILE_READ.read(), cbc, iv)) # writes the encrypted line
+                    encryptor = aes.encryptor("cbc", iv)
+                    while chunk := FILE_READ.read(CHUNK_SIZE): # feeds the text in pieces
+                        FILE_WRITE.write(encryptor.update(chunk.encode("utf-8"))) # writes the encrypted blocks
+                    FILE_WRITE.write(encryptor.finalize()) # writes the padded last block
                 except Exception as e:
                     print(f"Encryption error: {e}")
                     return False # ECB works as one string so all fails
             else:
-                for parse_line in FILE_READ.readlines(): # iterate through txt file
+                for parse_line in FILE_READ: # iterate through txt file, one line in memory at a time
                     try:
                         new_line = aes.encrypt(parse_line)
                         FILE_WRITE.write(new_line) # writes the encrypted line
@@ -40,7 +47,11 @@ def decrypt_file(args: list, file_in: str, file_out: str) -> bool:
             # read cbc differently than ecb because of iv   
             if cbc:
                 try:
-                    FILE_WRITE.write(aes.decrypt(FILE_READ.read(), cbc, iv)) # writes decrypted chunks to txt file 
+                    decryptor = aes.decryptor("cbc", iv)
+                    decoder = codecs.getincrementaldecoder("utf-8")() # characters may be split across pieces
+                    while chunk := FILE_READ.read(CHUNK_SIZE): # feeds the bin file in pieces
+                        FILE_WRITE.write(decoder.decode(decryptor.update(chunk))) # writes decrypted chunks to txt file 
+                    FILE_WRITE.write(decoder.decode(decryptor.finalize(), final=True)) # writes the unpadded last block
                 except Exception as e:
                     print(f"Decryption error: {e}") 
                     return False # ECB works as one string so all fails
@@ -56,26 +67,93 @@ def decrypt_file(args: list, file_in: str, file_out: str) -> bool:
                         print(f"Decryption error: {e}")
     return True
 
-def main(file: str, file_out=None) -> None:
+def stream_file(args: list, file_in: str, file_out: str, encrypt: bool) -> bool:
+    """Encrypts or decrypts any file (text or binary) through a memory map, one aligned window at a time.
+    The whole file is one ECB or CBC message, memory use does not depend on the file size."""
+    aes, cbc, iv = args
+    start_time = time.perf_counter()
+    with open(file_in, "rb") as FILE_READ, open(file_out, "wb") as FILE_WRITE:
+        try:
+            # empty files cannot be mapped, the map is closed even when en/decryption fails
+            mapping = mmap.mmap(FILE_READ.fileno(), 0, access=mmap.ACCESS_READ) if Path(file_in).stat().st_size else contextlib.nullcontext(b"")
+            with mapping as source, memoryview(source) as view:
+                stream = (aes.encryptor if encrypt else aes.decryptor)("cbc" if cbc else "ecb", iv)
+                for index in range(0, len(view), WINDOW_SIZE):
+                    FILE_WRITE.write(stream.update(view[index: index + WINDOW_SIZE])) # writes each window as it is done
+                FILE_WRITE.write(stream.finalize()) # writes the padded (or unpadded) last block
+        except Exception as e:
+            print(f"{'Encryption' if encrypt else 'Decryption'} error: {e}")
+            return False
+
+    execution_time = time.perf_counter() - start_time
+    size = Path(file_in).stat().st_size
+    print(f"Streamed {size / 1e6:.2f} MB in {execution_time:.2f}s ({size / 1e6 / max(execution_time, 1e-9):.2f} MB/s)")
+    return True
+
+def container_file(args: list, file_in: str, file_out: str, encrypt: bool, cipher_mode="gcm", compress=None) -> bool:
+    """Writes any file into a chunked container (header, independently encrypted chunks, index) or reads one back.
+    The mode, ivs and compression are stored in the container, config.json only provides the key."""
+    aes = args[0]
+    try:
+        with open(file_in, "rb") as FILE_READ, open(file_out, "wb") as FILE_WRITE:
+            if encrypt:
+                with ContainerWriter(FILE_WRITE, aes, cipher_mode, compress=compress) as container:
+                    while chunk := FILE_READ.read(WINDOW_SIZE): # feeds the file in pieces
+                        container.write(chunk)
+            else:
+                with ContainerReader(FILE_READ, aes) as container:
+                    while chunk := container.read(WINDOW_SIZE): # decrypts one piece at a time
+                        FILE_WRITE.write(chunk)
+    except Exception as e:
+        print(f"{'Encryption' if encrypt else 'Decryption'} error: {e}")
+        return False
+    return True
+
+def fastest_engine(aes_key, batched: bool) -> AES:
+    """Batched work (ECB, CBC decryption) is fastest on numpy (optional), one block at a time (CBC encryption) on tables."""
+    try:
+        return AES(aes_key, "numpy" if batched else "table")
+    except ImportError:
+        return AES(aes_key, "table")
+
+def output_path(file: str, encrypt: bool) -> str:
+    """Default output location, text and bin files keep the original naming, other files keep their extension."""
+    if file[-3:] in ["txt", "bin"] and (encrypt or Path(file[:-4]).suffix == ""):
+        return file[:-4] + "_output." + ("bin" if encrypt else "txt") # creates path for file output
+    if encrypt:
+        return file + ".bin" # photo.png => photo.png.bin
+    original = Path(file[:-4])
+    return str(original.with_name(original.stem + "_output" + original.suffix)) # photo.png.bin => photo_output.png
+
+def main(file: str, file_out=None, stream=False, container=None, compress=None) -> None:
     """Main function that handles arguments and produces output"""
     assert is_file(file), "Specified input file does not exist."
-    assert file[-3:] in ["txt", "bin"], "Incorrect file type. [txt, bin]"
+    assert stream or container or file[-3:] in ["txt", "bin"], "Incorrect file type. [txt, bin] (use streaming or container mode for other files)"
 
-    encrypt = True if file[-3:] == "txt" else False # encrypts if it is a text file, decrypts if it is a bin
+    encrypt = True if file[-3:] != "bin" else False # encrypts if it is a text (or any other) file, decrypts if it is a bin
 
     # optional param to specify existing output location, default is to create a new file
     if file_out is None:
-        file_out = file[:-4] + "_output." + ("bin" if encrypt else "txt") # creates path for file output
+        file_out = output_path(file, encrypt)
     else:
         assert is_file(file_out), "Specified output file does not exist."
 
     # creates AES object for encryption / decryption
     aes_key, cbc, iv = load_encryption_settings() # gets key from config.json for encryption
-    aes = AES(aes_key)
+    container = container if encrypt else (is_container(file) or None) # containers are recognized by their header
+    if container:
+        aes = fastest_engine(aes_key, not (container == "cbc" and encrypt))
+    else:
+        aes = fastest_engine(aes_key, not (cbc and encrypt)) if stream else AES(aes_key)
 
     args = [aes, cbc, iv]
 
-    status = encrypt_file(args, file, file_out) if encrypt else decrypt_file(args, file, file_out)
+    if container:
+        status = container_file(args, file, file_out, encrypt, container, compress)
+    elif stream:
+        status = stream_file(args, file, file_out, encrypt)
+    else:
+        status = encrypt_file(args, file, file_out) if encrypt else decrypt_file(args, file, file_out)
     if status:
         print("File encryption success." if encrypt else "File decryption success.")
         print(f"Output of \"{file}\" found in \"{file_out}\"")
@@ -92,4 +170,16 @@ if __name__ == "__main__":
     # file = "apps/textfiles/data/file_text_ecb_output.bin" # text file to dencrypt (ECB)
     # file = "apps/textfiles/data/file_text_cbc.txt" # text file to encrypt (CBC)
     file = "apps/textfiles/data/file_text_cbc_output.bin" # text file to decrypt (CBC)
-    main(file) # main method
\ No newline at end of file
+
+    # optional command line: python3 apps/textfiles/src/convert_file.py big.log --stream
+    parser = argparse.ArgumentParser(description='Encrypt a file (.txt or any file with --stream) or decrypt a .bin file.')
+    parser.add_argument("file", nargs="?", default=file, help="file to convert")
+    parser.add_argument("--out", default=None, help="existing output file (default creates one next to the input)")
+    parser.add_argument("--stream", action="store_true", help="memory mapped streaming mode for large and binary files")
+    parser.add_argument("--container", nargs="?", const="gcm", choices=["gcm", "ctr", "cbc"], help="write a chunked, indexed container (containers are always detected when decrypting)")
+    parser.add_argument("--compress", nargs="?", const="zlib", choices=["zlib", "lzma"], help="compress each container chunk before encrypting (skipped when it does not help)")
+    args = parser.parse_args()
+    assert not args.compress or args.container, "Compression is stored in the container header, use it with --container."
+
+    start_metrics() # optional metrics (AES_METRICS, AES_METRICS_PORT, AES_METRICS_FILE)
+    main(args.file, args.out, args.stream, args.container, args.compress) # main method
\ No newline at end of file
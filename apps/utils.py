@@ -1,7 +1,21 @@
-import json
+import atexit, json, os
 
 def load_encryption_settings() -> tuple:
     """This method fetches the key written in config.json"""
     file = open("config.json")
     data = json.load(file)
-    return (data['Key'], data['CBC'], data['IV'])
\ No newline at end of file
+    return (data['Key'], data['CBC'], data['IV'])
+
+def start_metrics() -> None:
+    """Turns on AES metrics from the environment.
+    AES_METRICS=1 records them, AES_METRICS_PORT serves them as json over http, AES_METRICS_FILE dumps them on exit."""
+    from aes.src.metrics import METRICS
+
+    port = os.environ.get("AES_METRICS_PORT")
+    path = os.environ.get("AES_METRICS_FILE")
+    if port or path:
+        METRICS.enabled = True
+    if port:
+        METRICS.serve(port=int(port))
+    if path:
+        atexit.register(METRICS.dump, path)
@@ -0,0 +1,247 @@
+# path to aes
+import sys
+sys.path.append('../applications-of-aes')
+
+# packages
+import argparse, json, platform, random, time
+from aes import AES
+
+try:
+    from Crypto.Cipher import AES as CryptoAES # pycryptodome, reference line when installed
+    from Crypto.Util.Padding import pad, unpad
+except ImportError:
+    CryptoAES = None
+
+## AES BENCHMARK ##
+SIZES = {"16B": 16, "1KiB": 1 << 10, "64KiB": 1 << 16, "1MiB": 1 << 20, "10MiB": 10 << 20, "100MiB": 100 << 20, "256MiB": 256 << 20}
+ENGINES = ["standard", "table", "numpy", "bitslice", "pycryptodome"]
+KEY_SIZES = [16, 24, 32]
+MODES = ["ecb", "cbc", "ctr", "gcm"]
+IV = b"YQB1f5Nt7SNEXoaR"
+NONCE = IV[:12]
+DEFAULT_BASELINE = "tests/aes_benchmark_baseline.json"
+COMPRESSION = ["none", "zlib", "lzma"]
+WORDS = "the server user message file key block round encrypt decrypt error connected joined password log request at from to".split()
+
+## CIPHERS ##
+def nonce_for(mode: str) -> bytes:
+    return {"ecb": None, "cbc": IV, "ctr": IV[:8], "gcm": NONCE}[mode]
+
+def one_shot(stream, data: bytes) -> bytes:
+    return stream.update(data) + stream.finalize()
+
+class Cipher:
+    """Uniform encrypt/decrypt over bytes for an AES engine."""
+    def __init__(self, key: bytes, engine: str) -> None:
+        self.key = key
+        self.engine = engine
+        self.aes = AES(key, engine)
+
+    def encrypt(self, mode: str, data: bytes) -> bytes:
+        return one_shot(self.aes.encryptor(mode, nonce_for(mode)), data)
+
+    def decrypt(self, mode: str, data: bytes) -> bytes:
+        return one_shot(self.aes.decryptor(mode, nonce_for(mode)), data)
+
+class CryptoCipher:
+    """Same interface on top of pycryptodome (C implementation), used as a reference line."""
+    def __init__(self, key: bytes, engine: str) -> None:
+        if CryptoAES is None:
+            raise ImportError("pycryptodome is not installed (pip install pycryptodome).")
+        self.key = key
+        self.engine = engine
+
+    def new(self, mode: str):
+        if mode == "ecb":
+            return CryptoAES.new(self.key, CryptoAES.MODE_ECB)
+        if mode == "cbc":
+            return CryptoAES.new(self.key, CryptoAES.MODE_CBC, iv=IV)
+        if mode == "ctr":
+            return CryptoAES.new(self.key, CryptoAES.MODE_CTR, nonce=nonce_for("ctr"))
+        return CryptoAES.new(self.key, CryptoAES.MODE_GCM, nonce=NONCE)
+
+    def encrypt(self, mode: str, data: bytes) -> bytes:
+        if mode == "gcm":
+            return b"".join(self.new(mode).encrypt_and_digest(data))
+        return self.new(mode).encrypt(pad(data, 16) if mode in ("ecb", "cbc") else data)
+
+    def decrypt(self, mode: str, data: bytes) -> bytes:
+        if mode == "gcm":
+            return self.new(mode).decrypt_and_verify(data[:-16], data[-16:])
+        decrypted = self.new(mode).decrypt(data)
+        return unpad(decrypted, 16) if mode in ("ecb", "cbc") else decrypted
+
+def make_cipher(key: bytes, engine: str):
+    return CryptoCipher(key, engine) if engine == "pycryptodome" else Cipher(key, engine)
+
+## TIMING ##
+def best_time(func, repeat: int, min_time=0.1) -> float:
+    """Seconds per call, best of repeat samples. Each sample loops func until it lasts at least min_time,
+    so fast calls are not timed at the clock's resolution (large inputs run once per sample)."""
+    number = 1
+    while True: # calibrate the calls per sample
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        execution_time = time.perf_counter() - start_time
+        if execution_time >= min_time:
+            break
+        number *= 2 if execution_time * 10 >= min_time else 10
+
+    best = execution_time / number
+    for _ in range(repeat - 1):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start_time) / number)
+    return best
+
+def key_schedule_time(key: bytes, repeat: int) -> float:
+    """Microseconds to expand a key (the cache is skipped so every run expands)."""
+    return best_time(lambda: AES(key, cache=False), repeat) * 1e6
+
+def typical_text(data_source, size: int) -> str:
+    """Chat/log style lines, the kind of input the apps encrypt."""
+    lines, length = [], 0
+    while length < size:
+        line = f"[{data_source.randrange(24):02}:{data_source.randrange(60):02}] user{data_source.randrange(50)} " + " ".join(data_source.choice(WORDS) for _ in range(data_source.randrange(3, 15)))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+def compression_runs(args, data_source, cipher, prefix: str, results: dict) -> None:
+    """End to end text encrypt/decrypt with and without compression, throughput counts the original text."""
+    for name in args.sizes:
+        size = SIZES[name]
+        text = typical_text(data_source, size)
+        for method in args.compression:
+            compress = False if method == "none" else method
+            label = f"{prefix}/text {method}/{name}"
+            encrypted = cipher.aes.encrypt(text, True, IV, compress)
+            seconds = best_time(lambda: cipher.aes.decrypt(cipher.aes.encrypt(text, True, IV, compress), True, IV, compress), args.repeat)
+            results[label] = {"blocks_per_second": (size / 16) / seconds, "mb_per_second": size / seconds / 1e6}
+            print(f"{label:<40}{results[label]['blocks_per_second']:>14,.0f} blocks/s{results[label]['mb_per_second']:>10.2f} MB/s  ({len(encrypted) / max(size, 1):.0%} of the text)")
+
+def run(args) -> dict:
+    """Measures every engine, key size, mode and size. Returns {"environment": ..., "results": {name: value}}."""
+    data_source = random.Random(args.seed) # same inputs on every run
+    results = {}
+
+    for key_length in args.key_sizes:
+        key = data_source.randbytes(key_length)
+        reference = Cipher(key, "table") # ciphertext is the same for every engine, so build it with one fast engine
+
+        for engine in args.engines:
+            try:
+                cipher = make_cipher(key, engine)
+            except ImportError as e:
+                print(f"{engine:<13}skipped ({e})")
+                continue
+            prefix = f"{engine}/{8 * key_length}"
+
+            if engine != "pycryptodome":
+                results[f"{prefix}/key_schedule"] = {"microseconds": key_schedule_time(key, args.repeat)}
+                print(f"{prefix + '/key_schedule':<40}{results[prefix + '/key_schedule']['microseconds']:>14,.1f} us")
+
+            if args.compression and engine != "pycryptodome":
+                compression_runs(args, data_source, cipher, prefix, results)
+
+            for mode in args.modes:
+                for direction in ("encrypt", "decrypt"):
+                    # a small probe decides which sizes finish within the time limit
+                    probe_text = data_source.randbytes(4096)
+                    probe_input = probe_text if direction == "encrypt" else reference.encrypt(mode, probe_text)
+                    probe = 4096 / best_time(lambda: getattr(cipher, direction)(mode, probe_input), 1, 0.01)
+
+                    for name in args.sizes:
+                        size = SIZES[name]
+                        label = f"{prefix}/{mode} {direction}/{name}"
+                        if size / probe > args.max_seconds:
+                            # recorded, so compare() notices a run that only got slow enough to be skipped
+                            results[label] = {"skipped": "too slow", "estimated_seconds": size / probe}
+                            print(f"{label:<40}{'too slow':>14}")
+                            continue
+
+                        text = data_source.randbytes(size)
+                        data = text if direction == "encrypt" else reference.encrypt(mode, text)
+                        seconds = best_time(lambda: getattr(cipher, direction)(mode, data), args.repeat)
+                        results[label] = {"blocks_per_second": (size / 16) / seconds, "mb_per_second": size / seconds / 1e6}
+                        print(f"{label:<40}{results[label]['blocks_per_second']:>14,.0f} blocks/s{results[label]['mb_per_second']:>10.2f} MB/s")
+
+    environment = {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system(), "seed": args.seed}
+    selection = {"engines": args.engines, "key_sizes": args.key_sizes, "modes": args.modes, "sizes": args.sizes, "compression": args.compression}
+    return {"environment": environment, "selection": selection, "results": results}
+
+## BASELINES ##
+def selected(label: str, selection: dict) -> bool:
+    """Whether a run with these arguments measures label ("engine/bits/key_schedule", "engine/bits/text method/size" or "engine/bits/mode direction/size")."""
+    engine, bits, test = label.split("/")[:3]
+    if engine not in selection["engines"] or int(bits) // 8 not in selection["key_sizes"]:
+        return False
+    if test == "key_schedule":
+        return engine != "pycryptodome"
+    kind, size = test.split(" ")[0], label.split("/")[3]
+    if kind == "text":
+        return test.split(" ")[1] in selection["compression"] and size in selection["sizes"]
+    return kind in selection["modes"] and size in selection["sizes"]
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """(label, reason) for every baseline result this run selected that got worse than threshold (a fraction, 0.2 = 20%), was skipped or is missing."""
+    regressions = []
+    for label, old in baseline["results"].items():
+        if "skipped" in old or not selected(label, current["selection"]):
+            continue # nothing to compare against, or not asked for this time
+        value = current["results"].get(label)
+        if value is None:
+            regressions.append((label, "missing from this run"))
+            continue
+        if "skipped" in value:
+            regressions.append((label, f"skipped ({value['skipped']}, ~{value['estimated_seconds']:.2f}s)"))
+            continue
+        if "microseconds" in value: # time, higher is worse
+            change = value["microseconds"] / old["microseconds"] - 1
+        else: # throughput, lower is worse
+            change = old["blocks_per_second"] / value["blocks_per_second"] - 1
+        if change > threshold:
+            regressions.append((label, f"{change:.0%} slower"))
+    return regressions
+
+def main(args) -> int:
+    """Runs the suite, optionally saves a baseline and fails (exit 1) on regressions."""
+    current = run(args)
+
+    if args.save:
+        with open(args.save, "w") as FILE:
+            json.dump(current, FILE, indent=4)
+        print(f"\nBaseline written to \"{args.save}\"")
+
+    if args.compare:
+        with open(args.compare) as FILE:
+            baseline = json.load(FILE)
+        regressions = compare(baseline, current, args.threshold)
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} against \"{args.compare}\"")
+        for label, reason in regressions:
+            print(f"\t{label}: {reason}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    """Run the file by copying into your terminal: python3 tests/aes_benchmark.py --sizes 1KiB 1MiB --engines table numpy --save tests/aes_benchmark_baseline.json"""
+    # create the parser
+    parser = argparse.ArgumentParser(description='Benchmark key schedule and encrypt/decrypt throughput of the AES engines and modes.')
+    # add arguments
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["16B", "1KiB", "64KiB", "1MiB"], help="input sizes to run")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES, help="engines to compare (pycryptodome is a reference line)")
+    parser.add_argument("--key-sizes", nargs="+", type=int, choices=KEY_SIZES, default=KEY_SIZES, help="key lengths in bytes")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="modes to time")
+    parser.add_argument("--compression", nargs="*", choices=COMPRESSION, default=[], help="also time CBC encrypt + decrypt of typical text with these compression settings (none, zlib, lzma)")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="skip runs expected to take longer than this")
+    parser.add_argument("--seed", type=int, default=197, help="seed for the generated keys and inputs")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="write results as a json baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="fail if results regressed against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    # parse the arguments
+    args = parser.parse_args()
+
+    sys.exit(main(args))
@@ -13,6 +13,7 @@ key192 = "hwRhjC5s2YtACanDktuXKxte"
 key256 = "w6HYstMa2dAxututGRaE2KPHdck9h9qg"
 
 keys = [key128, key192, key256] 
+engines = ["standard", "table", "numpy", "bitslice"] # numpy is skipped when it is not installed
 
 cbc = True
 iv = "YQB1f5Nt7SNEXoaR"
@@ -29,4 +30,409 @@ for key in keys:
     print(f"Encrypted:\t{encrypted}")
 
     decrypted = cipher.decrypt(encrypted, cbc, iv) # Decrypt
-    print(f"Decrypted:\t{decrypted}\n")
\ No newline at end of file
+    print(f"Decrypted:\t{decrypted}\n")
+
+    # every engine must produce byte-identical output to the standard rounds
+    for engine in engines:
+        try:
+            engine_cipher = AES(key, engine)
+        except ImportError:
+            continue
+        assert engine_cipher.encrypt(plaintext, cbc, iv) == encrypted, f"{engine} engine encryption mismatch"
+        assert engine_cipher.decrypt(encrypted, cbc, iv) == plaintext, f"{engine} engine decryption mismatch"
+    print(f"Engines:\tall available engines match\n")
+
+    # ctr keeps the length and can start decrypting at any offset
+    encrypted_ctr = cipher.encrypt_ctr(plaintext.encode("utf-8"), iv[:8])
+    assert len(encrypted_ctr) == len(plaintext) and cipher.decrypt_ctr(encrypted_ctr[5:], iv[:8], 5) == plaintext[5:].encode("utf-8")
+    print(f"CTR:\t\t{encrypted_ctr}\n")
+
+    # gcm authenticates the ciphertext and associated data
+    encrypted_gcm = cipher.encrypt_gcm(plaintext.encode("utf-8"), iv[:12], "header")
+    assert cipher.decrypt_gcm(encrypted_gcm, iv[:12], "header") == plaintext.encode("utf-8")
+    try:
+        cipher.decrypt_gcm(encrypted_gcm, iv[:12], "modified")
+        raise AssertionError("gcm accepted modified associated data")
+    except ValueError:
+        pass
+    print(f"GCM:\t\t{encrypted_gcm}\n")
+
+    # bytes-native buffers, binary data ending in a small byte value must survive padding
+    binary = bytes(range(15, -1, -1))
+    output = bytearray(cipher.encrypted_size(len(binary), "cbc"))
+    written = cipher.encrypt_into(binary, output, "cbc", iv)
+    restored = bytearray(written)
+    assert restored[:cipher.decrypt_into(memoryview(output), restored, "cbc", iv)] == binary
+    print(f"Buffers:\t{bytes(output)}\n")
+
+## FEATURE TESTS ##
+import asyncio, contextlib, io, os, socket, subprocess, tempfile, warnings
+from aes.src import compression
+from aes.src.cache import KEY_CACHE, KeyScheduleCache
+from aes.src.container import ContainerReader, ContainerWriter, ENTRY, TRAILER
+from aes.src.metrics import METRICS, BUCKET_COUNT, Histogram
+from aes.src.parallel import ParallelAES
+from aes.src.records import RecordWriter, open_log
+from apps.sockets.src.history import History
+from apps.sockets.src.outbound import BULK_BATCH, OutboundQueue
+from apps.sockets.src.protocol import FILE_CHUNK, FILE_START, MESSAGE, NAME, FrameReader, encode_frame, read_frame
+from apps.sockets.src.sharded import WorkerServer
+from apps.sockets.src.transfer import Receiver, Sender, seal, unseal
+
+cipher = AES(key128, "table")
+
+# key schedule cache, least recently used keys are evicted first and every AES object with a cached key shares its schedule
+builds = []
+cache = KeyScheduleCache(2)
+for key in (b"a", b"b", b"a", b"c", b"a", b"b"): # the third "a" hits, "c" evicts "b" (least recently used), so "b" is built again
+    cache.get(key, lambda: builds.append(key) or ([], 10))
+assert builds == [b"a", b"b", b"c", b"b"] and cache.stats() == {"size": 2, "max_size": 2, "hits": 2, "misses": 4, "evictions": 2}
+cache.resize(1)
+assert list(cache.schedules) == [cache.key_hash(b"b")] and cache.evictions == 3
+cache.resize(0) # caching off, every get builds
+cache.get(b"b", lambda: builds.append(b"b") or ([], 10))
+assert len(builds) == 5 and cache.stats()["size"] == 0
+hits = KEY_CACHE.hits
+assert AES(key192).schedule is AES(key192, "table").schedule and KEY_CACHE.hits == hits + 2 # expanded by the tests above
+assert AES(key192, cache=False).schedule is not AES(key192).schedule
+size = subprocess.run([sys.executable, "-c", "from aes.src.cache import KEY_CACHE; print(KEY_CACHE.max_size)"],
+                      env={**os.environ, "AES_KEY_CACHE_SIZE": "7", "PYTHONPATH": os.pathsep.join(sys.path)}, capture_output=True, text=True).stdout
+assert size.strip() == "7", "AES_KEY_CACHE_SIZE sets the cache size"
+print("Key cache:\tlru hits, misses, evictions and resize\n")
+
+# metrics, a timed call adds one to the count, its utf-8 bytes and one histogram bucket
+histogram = Histogram()
+for seconds in (0.5e-6, 2e-6, 2e-6, 1e3): # under 1 microsecond, 2 microseconds twice, over the last bucket
+    histogram.record(seconds)
+assert histogram.counts[0] == 1 and histogram.counts[5] == 2 and histogram.counts[BUCKET_COUNT - 1] == 1
+assert histogram.percentile(50) == 2 ** (5 / 4) / 1000 # upper bound of the 2 microsecond bucket, in milliseconds
+
+enabled = METRICS.enabled
+METRICS.reset()
+METRICS.enabled = False
+cipher.encrypt("not recorded")
+assert not METRICS.series, "disabled metrics record nothing"
+METRICS.enabled = True
+text = "héllo wörld ✓" # 13 characters, 17 bytes
+cipher.encrypt(text)
+cipher.encrypt(text, cbc, iv)
+METRICS.register("test_source", lambda: {"ok": True})
+snapshot = METRICS.snapshot()
+count, size, seconds, histogram = METRICS.series[("encrypt", "ecb", 128)]
+METRICS.enabled = enabled
+METRICS.reset()
+assert count == 1 and size == 17 and seconds > 0 and sum(histogram.counts) == 1
+operations = {(entry["operation"], entry["mode"], entry["key_bits"]): entry for entry in snapshot["operations"]}
+assert operations[("encrypt", "ecb", 128)]["count"] == 1 and operations[("encrypt", "cbc", 128)]["bytes"] == 17
+assert snapshot["test_source"] == {"ok": True} and "key_cache" in snapshot
+del METRICS.sources["test_source"]
+print("Metrics:\tcounts, utf-8 bytes and histogram buckets\n")
+
+# parallel aes, inputs under min_size stay in this process, larger ones go through the pool and shared memory
+text = "parallel blocks " * 640 # 10 KiB
+with ParallelAES(key128, "table", processes=2) as parallel:
+    parallel.min_size, parallel.chunk_size = 4096, 1024 # several chunks per input without megabytes of pure python aes
+    assert parallel.encrypt(text[:100]) == cipher.encrypt(text[:100]) and parallel.pool is None, "small inputs skip the pool"
+    encrypted = parallel.encrypt(text)
+    assert parallel.pool is not None and encrypted == cipher.encrypt(text) and parallel.decrypt(encrypted) == text, "ecb through the pool"
+    encrypted = cipher.encrypt(text, True, iv)
+    assert parallel.decrypt(encrypted, True, iv) == text, "cbc decryption through the pool"
+    assert parallel.encrypt_ctr(text.encode(), iv[:8], 3) == cipher.encrypt_ctr(text.encode(), iv[:8], 3), "ctr through the pool"
+assert parallel.pool is None
+print("Parallel:\tsmall inputs in process, ecb, cbc and ctr through the pool\n")
+
+# containers, random access reads only the chunks asked for
+data = bytes(range(256)) * 40 # 10 KiB
+for mode in ("gcm", "ctr", "cbc"):
+    FILE = io.BytesIO()
+    with ContainerWriter(FILE, cipher, mode, chunk_size=1024) as writer:
+        writer.write(data)
+    container = FILE.getvalue()
+    reader = ContainerReader(io.BytesIO(container), cipher)
+    reader.seek(3000)
+    assert reader.read(2500) == data[3000:5500] and reader.tell() == 5500, f"{mode} container random access"
+
+# gcm containers, a modified chunk and a truncated container (index rewritten) are both rejected
+FILE = io.BytesIO()
+with ContainerWriter(FILE, cipher, "gcm", chunk_size=1024) as writer:
+    writer.write(data)
+container = FILE.getvalue()
+index_offset, count, _ = TRAILER.unpack(container[-TRAILER.size:])
+entries = list(ENTRY.iter_unpack(container[index_offset: index_offset + ENTRY.size * count]))
+modified = bytearray(container)
+modified[entries[2][0]] ^= 1
+try:
+    reader = ContainerReader(io.BytesIO(bytes(modified)), cipher)
+    reader.seek(2048)
+    reader.read(10)
+    raise AssertionError("container accepted a modified chunk")
+except ValueError:
+    pass
+end = entries[3][0] # keep 3 chunks
+truncated = container[:end] + b"".join(ENTRY.pack(*entry) for entry in entries[:3]) + TRAILER.pack(end, 3, b"AESI")
+try:
+    ContainerReader(io.BytesIO(truncated), cipher)
+    raise AssertionError("container accepted a truncated file")
+except ValueError:
+    pass
+print("Containers:\trandom access, tamper and truncation detection\n")
+
+# record logs, skip without decrypting, recovery of a record torn by a crash and detection of records cut off the end
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "log.bin")
+    with open_log(path, cipher, "a") as log:
+        offsets = [log.append(f"record {index}") for index in range(5)]
+    with open_log(path, cipher) as log:
+        assert list(log.records(skip=3)) == [b"record 3", b"record 4"] and log.count == 5
+        assert log.read(offsets[1]) == b"record 1"
+
+    with open(path, "r+b") as FILE:
+        FILE.seek(0, os.SEEK_END)
+        FILE.seek(FILE.tell() - 20)
+        FILE.write(b"\x00\x00\x00\x40torn record") # an append cut short, over the sealed end
+    try:
+        open_log(path, cipher)
+        raise AssertionError("record log without its sealed end was read")
+    except ValueError:
+        pass
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        with open_log(path, cipher, "a") as log: # opening to append keeps the complete records and warns
+            log.append("record 5")
+    assert len(caught) == 1 and os.path.getsize(path + ".torn") > 0, "torn bytes are reported and kept"
+    with open_log(path, cipher) as log:
+        assert list(log)[-2:] == [b"record 4", b"record 5"] and log.count == 6
+
+    with open(path, "r+b") as FILE: # cut the last record off at a record boundary
+        FILE.truncate(offsets[4])
+    for mode in ("r", "a"):
+        try:
+            (open_log(path, cipher) if mode == "r" else RecordWriter(path, cipher, recover=False)).close()
+            raise AssertionError("records cut off the end were not noticed")
+        except ValueError:
+            pass
+print("Record logs:\tskip, torn record recovery and truncation detection\n")
+
+# compression, the first byte records how the data was stored
+text = ("the quick brown fox jumps over the lazy dog " * 100).encode()
+for method, flag in (("zlib", compression.ZLIB), ("lzma", compression.LZMA)):
+    packed = compression.compress(text, method)
+    assert packed[0] == flag and len(packed) < len(text) and compression.decompress(packed) == text, f"{method} round trip"
+random_bytes = os.urandom(4096)
+assert compression.compress(random_bytes)[0] == compression.STORED and compression.decompress(compression.compress(random_bytes)) == random_bytes
+assert compression.compress(b"short")[0] == compression.STORED
+bomb = compression.compress(bytes(8 << 20)) # 8 MiB of zeros in about 8 KiB
+for damaged, limit in ((bomb, 1 << 20), (bomb[:-100], 8 << 20)): # expands too far, cut short
+    try:
+        compression.decompress(damaged, limit)
+        raise AssertionError("decompress ignored its limit or a truncated payload")
+    except ValueError:
+        pass
+assert len(compression.decompress(bomb, 8 << 20)) == 8 << 20
+assert cipher.decrypt(cipher.encrypt(text.decode(), cbc, iv, "zlib"), cbc, iv, True) == text.decode()
+print("Compression:\tflag byte, round trips and output limits\n")
+
+# chat history, the oldest frames are evicted by count and by bytes, replay is every stored frame in order
+history = History(max_frames=3, max_bytes=100)
+frames = [encode_frame(MESSAGE, bytes([index]) * 10) for index in range(5)] # 15 bytes each
+for frame in frames:
+    history.append(frame)
+assert history.replay() == b"".join(frames[2:]) and history.evicted == 2
+history.append(encode_frame(MESSAGE, b"x" * 70)) # 75 bytes, only one 15 byte frame still fits beside it
+assert history.replay() == frames[4] + encode_frame(MESSAGE, b"x" * 70) and history.evicted == 4
+assert history.stats()["hits"] == 2 and History(2, 10).replay() == b"" # an empty history replays nothing
+print("History:\teviction and replay\n")
+
+# outbound queues, what each overflow policy does when a client stops reading, and bulk frames after chat frames
+class StalledWriter:
+    """Stands in for a client's StreamWriter, drain() waits until the test lets the client read."""
+    def __init__(self) -> None:
+        self.writes = []
+        self.reading = asyncio.Event()
+        self.closed = self.aborted = False
+        self.transport = self
+
+    def write(self, data: bytes) -> None:
+        self.writes.append(data)
+
+    async def drain(self) -> None:
+        await self.reading.wait()
+
+    def abort(self) -> None:
+        self.aborted = True
+
+    def close(self) -> None:
+        self.closed = True
+
+async def outbound_checks() -> None:
+    frames = [encode_frame(MESSAGE, bytes([index])) for index in range(4)]
+
+    writer = StalledWriter()
+    queue = OutboundQueue(writer, 2, "drop_oldest")
+    assert all(queue.put(frame) for frame in frames[:3]) and queue.dropped == 1
+    await asyncio.sleep(0) # the writer task sends both queued frames as one write
+    assert writer.writes == [frames[1] + frames[2]] and queue.stats()["depth"] == 0
+    queue.close()
+
+    writer = StalledWriter()
+    queue = OutboundQueue(writer, 2, "disconnect")
+    assert queue.put(frames[0]) and queue.put(frames[1]) and not queue.put(frames[2])
+    assert queue.closed and writer.aborted and not queue.put(frames[3])
+
+    writer = StalledWriter()
+    queue = OutboundQueue(writer, 2, "block")
+    queue.put(frames[0])
+    await asyncio.sleep(0) # written, the writer task now waits for the client
+    assert queue.put(frames[1]) and queue.put(frames[2]) and not queue.put(frames[3]) and queue.dropped == 0
+    waiting = asyncio.create_task(queue.put_wait(frames[3])) # the sender waits for room instead of dropping
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    writer.reading.set()
+    await asyncio.sleep(0.01)
+    assert waiting.done() and b"".join(writer.writes) == b"".join(frames)
+    queue.close()
+
+    writer = StalledWriter()
+    queue = OutboundQueue(writer, 16)
+    chunks = [encode_frame(FILE_CHUNK, bytes([index]) * (BULK_BATCH // 3)) for index in range(5)]
+    for chunk in chunks:
+        queue.put(chunk)
+    queue.put(frames[0]) # queued after the transfer, sent before it
+    await asyncio.sleep(0)
+    assert writer.writes == [frames[0] + b"".join(chunks[:3])], "one write holds the chat frames and about BULK_BATCH bulk bytes"
+    queue.put(frames[1])
+    writer.reading.set()
+    await asyncio.sleep(0.01)
+    assert writer.writes[1:] == [frames[1] + b"".join(chunks[3:])]
+    queue.close()
+
+asyncio.run(outbound_checks())
+print("Outbound:\tdrop_oldest, disconnect and block policies, bulk batches\n")
+
+# sharded server, two workers joined by a socket pair as ShardedServer connects them (in one process so the clients land where the test wants)
+async def sharded_checks() -> None:
+    first_socket, second_socket = socket.socketpair(socket.AF_UNIX)
+    workers = [WorkerServer("127.0.0.1", 0, 16, [peer_socket], 64, "drop_oldest", 0, 0) for peer_socket in (first_socket, second_socket)]
+    ports = []
+    for worker in workers:
+        await worker.connect_peers()
+        listener = await asyncio.start_server(worker.handle_client, "127.0.0.1", 0)
+        ports.append(listener.sockets[0].getsockname()[1])
+
+    async def join(port: int, name: str) -> tuple:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode_frame(NAME, name.encode()))
+        await read_frame(reader) # connected list
+        return reader, writer
+
+    alice = await join(ports[0], "alice")
+    await asyncio.sleep(0.05)
+    assert workers[1].connected_names() == ["alice"], "a join on one worker is forwarded to the other"
+    bob = await join(ports[1], "bob")
+    await asyncio.sleep(0.05)
+    assert sorted(workers[0].connected_names()) == ["alice", "bob"]
+
+    bob[1].write(encode_frame(MESSAGE, b"ciphertext"))
+    while True: # alice first sees bob's join notice
+        frame = await asyncio.wait_for(read_frame(alice[0]), 2)
+        if frame[0] == MESSAGE:
+            break
+    assert frame == (MESSAGE, b"ciphertext"), "a broadcast reaches the clients of the other worker"
+
+    alice[1].close()
+    await asyncio.sleep(0.05)
+    assert workers[1].connected_names() == ["bob"], "a leave is forwarded too"
+    bob[1].close()
+    await asyncio.sleep(0.05)
+
+with contextlib.redirect_stdout(io.StringIO()): # connect and message prints of the workers
+    asyncio.run(sharded_checks())
+print("Sharded:\tjoins, leaves and broadcasts across workers\n")
+
+# file transfers, sealed chunks are bound to their transfer, type and index, the receiver rebuilds the file and survives bad input
+transfer_id = os.urandom(8)
+sealed = seal(cipher, transfer_id, FILE_CHUNK, 3, b"chunk")
+assert unseal(cipher, FILE_CHUNK, sealed) == (transfer_id, 3, b"chunk")
+for frame_type, payload in ((FILE_START, sealed), (FILE_CHUNK, sealed[:8] + (4).to_bytes(4, "big") + sealed[12:])):
+    try:
+        unseal(cipher, frame_type, payload)
+        raise AssertionError("a chunk with another type or index was accepted")
+    except ValueError:
+        pass
+
+with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+    source = os.path.join(directory, "source.bin")
+    with open(source, "wb") as FILE:
+        FILE.write(os.urandom(10000))
+    frames = [FrameReader().feed(frame)[0] for frame, _ in Sender(cipher, source, "alice", chunk_size=1024).frames()]
+    receiver = Receiver(cipher, os.path.join(directory, "downloads"))
+    for frame_type, payload in frames:
+        receiver.handle(frame_type, payload)
+    with open(source, "rb") as FILE, open(os.path.join(directory, "downloads", "source.bin"), "rb") as RECEIVED:
+        assert FILE.read() == RECEIVED.read() and not receiver.active, "received file matches"
+
+    for frame_type, payload in frames[:3] + frames[4:]: # a dropped chunk aborts the transfer and removes its .part file
+        receiver.handle(frame_type, payload)
+    assert not receiver.active and sorted(os.listdir(os.path.join(directory, "downloads"))) == ["source.bin"]
+
+    receiver.handle(FILE_START, seal(cipher, os.urandom(8), FILE_START, 0, b"not json")) # authentic but unusable metadata
+    receiver.handle(FILE_START, seal(cipher, os.urandom(8), FILE_START, 0, b'{"name": "x"}'))
+    assert not receiver.active, "bad metadata is ignored instead of ending the receive thread"
+print("Transfers:\tsealed chunks, reassembly, dropped chunks and bad metadata\n")
+
+# framing, frames split and merged in any way come out whole
+stream = b"".join(encode_frame(MESSAGE, bytes([index]) * index) for index in range(1, 30))
+reader = FrameReader()
+received = []
+for index in range(0, len(stream), 7): # 7 byte pieces split headers and payloads
+    received += reader.feed(stream[index: index + 7])
+assert received == [(MESSAGE, bytes([index]) * index) for index in range(1, 30)] and not reader.buffer
+print("Framing:\tpartial and merged frames\n")
+
+
+## PASSWORD VAULT TESTS ##
+import json
+from apps.pwmanager.src.manager import Manager
+from apps.pwmanager.src.vault import Vault
+from apps.utils import load_encryption_settings
+
+with tempfile.TemporaryDirectory() as directory:
+    # the old layout, one .bin per password listed in manage.json
+    manager_path = os.path.join(directory, "manage.json")
+    old_path = os.path.join(directory, "OLD.bin")
+    config_key, config_cbc, config_iv = load_encryption_settings() # the manager's key and settings
+    with open(old_path, "wb") as FILE:
+        FILE.write(AES(config_key).encrypt("old password", config_cbc, config_iv))
+    with open(manager_path, "w") as FILE:
+        json.dump({"manage": {"Site": [{"old user": old_path}], "Gone": [{"user": os.path.join(directory, "MISSING.bin")}]}}, FILE)
+
+    # migration moves it into the vault and removes the old files, a missing .bin is reported and skipped
+    vault_path = os.path.join(directory, "vault.bin")
+    manager = Manager(vault_path, manager_path)
+    assert manager.vault.logins("Site") == [("old user", "old password")]
+    assert not os.path.exists(manager_path) and not os.path.exists(old_path), "old layout was not removed"
+
+    # round trip through a reopen, then compaction keeps only the live logins
+    manager.add_data("Site", "second user", "second password")
+    for index in range(10):
+        manager.add_data(f"Other {index}", "user", "password")
+        manager.remove_data(f"Other {index}")
+    manager.vault.close()
+    vault = Vault(vault_path, manager.vault_aes, compact_min=1000)
+    assert vault.logins("Site") == [("old user", "old password"), ("second user", "second password")]
+    assert vault.dead == 20
+    size = vault.stats()["bytes"]
+    vault.compact()
+    assert vault.dead == 0 and vault.stats()["bytes"] < size
+    assert vault.locations() == ["Site"] and vault.logins("Site")[1] == ("second user", "second password")
+    vault.close()
+
+    # a damaged record is skipped and counted as dead, the vault still opens with every other login
+    with open(vault_path, "r+b") as FILE:
+        FILE.seek(-60, os.SEEK_END) # inside the last record, before the sealed end
+        byte = FILE.read(1)
+        FILE.seek(-1, os.SEEK_CUR)
+        FILE.write(bytes([byte[0] ^ 1]))
+    with Vault(vault_path, manager.vault_aes) as vault:
+        assert vault.logins("Site") == [("old user", "old password")] and vault.damaged == 1 and vault.dead == 1
+print("Vault:\t\tmigration, round trip, compaction and damaged records\n")